@@ -0,0 +1,24 @@
+"""
+Flags de inicialização do Chromium compartilhadas por scraper.py e browser_server.py
+"""
+
+# Flags do Chromium: sem throttling de abas em segundo plano (headless roda
+# sempre "em background"), sem isolamento de sites e sem serviços de perfil
+CHROMIUM_ARGS = [
+    '--disable-blink-features=AutomationControlled',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-background-timer-throttling',
+    '--disable-backgrounding-occluded-windows',
+    '--disable-renderer-backgrounding',
+    '--disable-site-isolation-trials',
+    '--disable-features=IsolateOrigins,site-per-process,Translate,BackForwardCache',
+    '--disable-extensions',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--metrics-recording-only',
+    '--mute-audio',
+    '--no-first-run',
+    '--no-default-browser-check',
+]
@@ -0,0 +1,58 @@
+"""
+Mantém um Chromium aberto para o scraper reaproveitar entre execuções
+Evita o cold start do navegador a cada run (ex: cron): o scraper conecta
+via CDP quando BROWSER_CDP_URL está definido no .env
+
+Roda em primeiro ou segundo plano (nohup, systemd): encerra com SIGINT/SIGTERM
+"""
+import os
+import signal
+import logging
+import threading
+from dotenv import load_dotenv
+from playwright.sync_api import sync_playwright
+
+from browser_flags import CHROMIUM_ARGS
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Inicia o navegador com porta de depuração e aguarda SIGINT/SIGTERM"""
+    load_dotenv()
+    port = int(os.getenv('BROWSER_CDP_PORT', '9222'))
+
+    # Sinais só marcam o evento; o navegador é fechado no fluxo normal abaixo
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stop.set())
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(
+            headless=os.getenv('HEADLESS', 'True').lower() == 'true',
+            args=CHROMIUM_ARGS + [f'--remote-debugging-port={port}']
+        )
+
+        logger.info("=" * 70)
+        logger.info("✅ NAVEGADOR ABERTO PARA O SCRAPER")
+        logger.info("=" * 70)
+        logger.info(f"   Defina no .env: BROWSER_CDP_URL=http://127.0.0.1:{port}")
+        logger.info("   Ctrl+C (ou SIGTERM) fecha o navegador")
+        logger.info("")
+
+        try:
+            # wait com timeout: mantém o processo responsivo aos sinais em todas as plataformas
+            while not stop.wait(1):
+                pass
+        finally:
+            logger.info("🛑 Fechando navegador...")
+            browser.close()
+
+
+if __name__ == '__main__':
+    main()
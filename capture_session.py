@@ -4,14 +4,12 @@ Abre navegador, permite login manual e salva cookies/session data
 """
 import os
 import sys
-import json
 import logging
 from pathlib import Path
+import orjson
 from dotenv import load_dotenv
 from playwright.sync_api import sync_playwright
 
-load_dotenv()
-
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -20,7 +18,15 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class AmazonSessionCapture:
+    # Cache de validação por processo: caminho -> (mtime_ns, válida?)
+    _validation_cache = {}
+
     def __init__(self):
+        # Carregar .env uma única vez por processo (não no import do módulo)
+        if not os.environ.get('_ENV_LOADED'):
+            load_dotenv()
+            os.environ['_ENV_LOADED'] = '1'
+
         self.session_dir = Path(os.getenv('SESSION_DIR', './puppeteer_session'))
         self.session_file = self.session_dir / 'amazon_session.json'
         self.amazon_url = 'https://www.amazon.com.br'
@@ -106,22 +112,23 @@ class AmazonSessionCapture:
                 logger.info("")
                 logger.info("💾 Salvando cookies e session data...")
 
-                # Pegar cookies do contexto (funciona mesmo se a página mudou)
-                cookies = context.cookies()
-
-                # Pegar storage state completo
+                # Pegar storage state completo (cookies + localStorage);
+                # é o formato que o Playwright reimporta via storage_state=
                 storage_state = context.storage_state()
+                cookies = storage_state['cookies']
 
                 # Salvar em arquivo JSON
                 from datetime import datetime
                 session_data = {
-                    'cookies': cookies,
                     'storage_state': storage_state,
                     'timestamp': datetime.now().isoformat()
                 }
 
-                with open(self.session_file, 'w', encoding='utf-8') as f:
-                    json.dump(session_data, f, indent=2, ensure_ascii=False)
+                # Serializar ANTES de abrir o arquivo: se falhar, a sessão
+                # anterior não é truncada. orjson gera UTF-8 direto
+                # (equivalente a ensure_ascii=False) e grava em um único write.
+                payload = orjson.dumps(session_data, option=orjson.OPT_INDENT_2)
+                self.session_file.write_bytes(payload)
 
                 logger.info(f"✅ Sessão salva em: {self.session_file}")
 
@@ -156,26 +163,48 @@ class AmazonSessionCapture:
     def validate_session(self):
         """
         Valida se existe uma sessão salva e se ainda está válida
+
+        O resultado fica em cache por processo, indexado pelo mtime do arquivo:
+        chamadas repetidas só reprocessam o JSON se a sessão foi regravada.
         """
         if not self.session_file.exists():
             logger.warning("⚠️ Nenhuma sessão salva encontrada")
             return False
 
+        cache_key = str(self.session_file.resolve())
+        mtime = self.session_file.stat().st_mtime_ns
+        cached = AmazonSessionCapture._validation_cache.get(cache_key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        is_valid = self._check_session_file()
+        AmazonSessionCapture._validation_cache[cache_key] = (mtime, is_valid)
+        return is_valid
+
+    def _check_session_file(self):
+        """Lê o arquivo de sessão e verifica estrutura e cookies importantes"""
         try:
-            with open(self.session_file, 'r', encoding='utf-8') as f:
-                session_data = json.load(f)
+            raw = self.session_file.read_bytes()
+
+            # Pré-filtro barato: sem nenhum nome de cookie importante no texto,
+            # a sessão é inválida e o parse completo do JSON é dispensado
+            if b'session-id' not in raw and b'ubid-acbbr' not in raw:
+                logger.warning("⚠️ Sessão não contém cookies importantes da Amazon")
+                return False
+
+            session_data = orjson.loads(raw)
 
             # Verificar estrutura básica
-            if 'cookies' not in session_data or 'storage_state' not in session_data:
+            storage_state = session_data.get('storage_state')
+            if not isinstance(storage_state, dict) or 'cookies' not in storage_state:
                 logger.warning("⚠️ Sessão salva está corrompida")
                 return False
 
-            # Verificar se tem cookies importantes
-            cookies = session_data['cookies']
-            important_cookies = ['session-id', 'ubid-acbbr']
+            # Verificar se tem cookies importantes (para no primeiro encontrado)
+            cookies = storage_state['cookies']
+            important_cookies = {'session-id', 'ubid-acbbr'}
 
-            cookie_names = [c['name'] for c in cookies]
-            has_important = any(name in cookie_names for name in important_cookies)
+            has_important = any(c.get('name') in important_cookies for c in cookies)
 
             if not has_important:
                 logger.warning("⚠️ Sessão não contém cookies importantes da Amazon")
@@ -198,8 +227,7 @@ class AmazonSessionCapture:
             return None
 
         try:
-            with open(self.session_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            return orjson.loads(self.session_file.read_bytes())
         except Exception as e:
             logger.error(f"❌ Erro ao carregar sessão: {e}")
             return None
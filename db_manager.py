@@ -3,45 +3,241 @@ Gerenciador de conexão com PostgreSQL para Amazon Offers
 Baseado no db_manager do Mercado Livre, adaptado para Amazon
 
 LÓGICA DE DUPLICAÇÃO (chave: URL_BASE + sale_price):
-- URL_BASE = tudo antes do "?" na original_url
+- URL_BASE = tudo antes do "?" na original_url (coluna gerada url_base,
+  com índice único - ver ensure_schema)
 - Se URL_BASE igual e sale_price igual → IGNORAR (não faz nada)
 - Se URL_BASE igual e sale_price diferente → ATUALIZAR status_* para "new",
   limpar sent_at_* e atualizar updated_at
 - Se URL_BASE não existe → INSERIR novo registro
 """
+import io
 import os
+import re
+import atexit
+from functools import lru_cache
 import psycopg2
 import logging
-from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import connection as PgConnection
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from urllib.parse import urlparse, urlunparse
-
-load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 # Timezone de Brasília (UTC-3)
 BRAZIL_TZ = ZoneInfo('America/Sao_Paulo')
 
+# Marcadores de aviso/erro que invalidam um link de afiliado (uma só varredura)
+INVALID_LINK_MARKERS_RE = re.compile(
+    r'⚠️|❌|erro|error|não é permitido|não permitido|indisponível',
+    re.IGNORECASE
+)
+
+# Limites do pool de conexões (reaproveitadas entre chamadas)
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 8
+
+# Campos de offer_data gravados em amazon_offers (ordem das colunas no INSERT)
+OFFER_FIELDS = (
+    'product_name',
+    'original_url',
+    'affiliate_url',
+    'image_url',
+    'asin',
+    'list_price',
+    'sale_price',
+    'discount_percentage',
+    'has_coupon',
+    'coupon_code',
+    'coupon_discount',
+    'promotion_text',
+    'prime_eligible',
+    'shipping_info',
+    'installment_info',
+    'rating',
+    'review_count',
+    'category',
+    'source_url',
+    'scrape_type',
+)
+
+# Linhas por statement no INSERT em lote
+BULK_PAGE_SIZE = 200
+
+# A partir deste tamanho, insert_offers_bulk usa COPY (bulk_load).
+# O scraper grava em lotes de flush_every (config.yml, padrão 50): o COPY só
+# entra com flush_every >= BULK_COPY_THRESHOLD ou em cargas chamadas direto
+BULK_COPY_THRESHOLD = 500
+
+# Canais de envio (colunas status_<canal> / sent_at_<canal>)
+SEND_CHANNELS = ('telegram', 'whatsapp', 'tiktok')
+
+# Minutos até uma reserva de get_offers_to_send sem mark_as_sent/release_claims
+# voltar para 'new' (worker que caiu no meio do envio)
+CLAIM_TIMEOUT_MINUTES = 30
+
+# Nome do UPSERT preparado (PREPARE/EXECUTE) em cada conexão do pool
+PREPARED_OFFER_UPSERT = 'offer_upsert'
+
+# UPSERT por URL_BASE: insere, atualiza se sale_price mudou, ou não faz nada
+# (nenhuma linha em RETURNING) se o preço é o mesmo
+_UPSERT_QUERY = """
+    INSERT INTO amazon_offers (
+        {columns},
+        status_telegram,
+        status_whatsapp,
+        status_tiktok,
+        created_at,
+        updated_at
+    )
+    {source}
+    ON CONFLICT (url_base) DO UPDATE SET
+        {updates},
+        -- Resetar status para reenvio
+        status_telegram = 'new',
+        status_whatsapp = 'new',
+        status_tiktok = 'new',
+        sent_at_telegram = NULL,
+        sent_at_whatsapp = NULL,
+        sent_at_tiktok = NULL,
+        -- Reservas em andamento deixam de valer (mark_as_sent só confirma 'claimed')
+        claimed_at_telegram = NULL,
+        claimed_at_whatsapp = NULL,
+        claimed_at_tiktok = NULL,
+        updated_at = EXCLUDED.updated_at
+    WHERE amazon_offers.sale_price IS DISTINCT FROM EXCLUDED.sale_price
+    RETURNING (xmax = 0) AS inserted{returning}
+"""
+
+
+@lru_cache(maxsize=None)
+def build_offer_queries(fields=OFFER_FIELDS):
+    """
+    Monta as queries de UPSERT para as colunas informadas
+
+    Args:
+        fields (tuple): Subconjunto ordenado de OFFER_FIELDS existente na tabela
+
+    Returns:
+        dict: Queries e metadados:
+            - template: VALUES de uma oferta (parâmetros nomeados)
+            - param_names: ordem dos parâmetros posicionais ($1, $2, ...)
+            - prepare: PREPARE do UPSERT de uma oferta
+            - execute: EXECUTE do UPSERT preparado (parâmetros %s)
+            - bulk: UPSERT em lote para execute_values
+            - fields: colunas usadas (ordem do COPY)
+            - copy_staging / copy / copy_upsert: carga via COPY em tabela
+              temporária seguida de INSERT ... SELECT com o mesmo UPSERT
+    """
+    template = (
+        '(' + ', '.join(f'%({field})s' for field in fields)
+        + ", 'new', 'new', 'new', %(now)s, %(now)s)"
+    )
+    columns = ',\n        '.join(fields)
+    updates = ',\n        '.join(
+        f'{field} = EXCLUDED.{field}' for field in fields if field != 'original_url'
+    )
+
+    # Uma oferta: o CTE lê o preço anterior (snapshot antes do UPSERT) só para log
+    insert_query = """
+    WITH previous AS (
+        SELECT sale_price
+        FROM amazon_offers
+        WHERE url_base = SPLIT_PART(%(original_url)s, '?', 1)
+    )""" + _UPSERT_QUERY.format(
+        columns=columns,
+        source=f'VALUES {template}',
+        updates=updates,
+        returning=',\n        (SELECT sale_price FROM previous) AS previous_price',
+    )
+
+    # Versão preparada: o Postgres faz parse/plan uma vez por conexão
+    param_names = fields + ('now',)
+    prepare_query = f"PREPARE {PREPARED_OFFER_UPSERT} AS " + re.sub(
+        r'%\((\w+)\)s',
+        lambda m: f'${param_names.index(m.group(1)) + 1}',
+        insert_query
+    )
+    execute_query = (
+        f"EXECUTE {PREPARED_OFFER_UPSERT} (" + ', '.join(['%s'] * len(param_names)) + ')'
+    )
+
+    # Lote via execute_values (o %s recebe as linhas formatadas pelo template)
+    bulk_query = _UPSERT_QUERY.format(
+        columns=columns,
+        source='VALUES %s',
+        updates=updates,
+        returning='',
+    )
+
+    # COPY: staging temporária (descartada no commit) + INSERT ... SELECT
+    column_list = ', '.join(fields)
+    copy_staging_query = (
+        f"CREATE TEMP TABLE amazon_offers_staging ON COMMIT DROP AS "
+        f"SELECT {column_list} FROM amazon_offers WITH NO DATA"
+    )
+    copy_query = f"COPY amazon_offers_staging ({column_list}) FROM STDIN WITH (FORMAT csv)"
+    copy_upsert_query = _UPSERT_QUERY.format(
+        columns=columns,
+        source=(
+            f"SELECT {column_list}, 'new', 'new', 'new', %(now)s, %(now)s\n"
+            f"    FROM amazon_offers_staging"
+        ),
+        updates=updates,
+        returning='',
+    )
+
+    return {
+        'template': template,
+        'param_names': param_names,
+        'prepare': prepare_query,
+        'execute': execute_query,
+        'bulk': bulk_query,
+        'fields': fields,
+        'copy_staging': copy_staging_query,
+        'copy': copy_query,
+        'copy_upsert': copy_upsert_query,
+    }
+
+
+def _csv_value(value):
+    """Formata um valor para COPY ... (FORMAT csv): vazio sem aspas é NULL"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+class OfferConnection(PgConnection):
+    """Conexão do pool que lembra com quais campos o UPSERT de ofertas foi preparado"""
+    offer_upsert_fields = None
+
 
 def get_base_url(url):
     """
     Extrai a URL base (antes do ?) para usar como chave de identificação.
     Ex: https://www.amazon.com.br/Apple-iPhone-15-128-GB/dp/B0CP6CVJSG?ref=...
     -> https://www.amazon.com.br/Apple-iPhone-15-128-GB/dp/B0CP6CVJSG
+
+    Mesmo corte da coluna url_base (SPLIT_PART(original_url, '?', 1)).
     """
     if not url:
         return url
-    parsed = urlparse(url)
-    # Reconstruir sem query string e fragment
-    base = urlunparse((parsed.scheme, parsed.netloc, parsed.path, '', '', ''))
-    return base
+    return url.partition('?')[0]
 
 
 class AmazonDatabaseManager:
     def __init__(self):
+        # Carregar .env uma única vez por processo (não no import do módulo)
+        if not os.environ.get('_ENV_LOADED'):
+            load_dotenv()
+            os.environ['_ENV_LOADED'] = '1'
+
         self.conn_params = {
             'host': os.getenv('POSTGRES_HOST', 'localhost'),
             'port': os.getenv('POSTGRES_PORT', '5432'),
@@ -49,18 +245,222 @@ class AmazonDatabaseManager:
             'user': os.getenv('POSTGRES_USER', 'n8n_user'),
             'password': os.getenv('POSTGRES_PASSWORD', '')
         }
+        # Pool criado na primeira conexão (não conecta ao instanciar)
+        self._pool = None
+        # Colunas de amazon_offers (information_schema), lidas uma vez
+        self._table_columns = None
+
+    def _get_pool(self):
+        """Retorna o pool de conexões, criando-o no primeiro uso"""
+        if self._pool is None:
+            self._pool = ThreadedConnectionPool(
+                POOL_MIN_CONN, POOL_MAX_CONN,
+                connection_factory=OfferConnection,
+                **self.conn_params
+            )
+            atexit.register(self.close)
+        return self._pool
 
     def connect(self):
-        """Cria uma conexão com o banco"""
-        return psycopg2.connect(**self.conn_params)
+        """Obtém uma conexão do pool (devolver com release())"""
+        return self._get_pool().getconn()
+
+    def release(self, conn):
+        """Devolve uma conexão ao pool (transação pendente sofre rollback)"""
+        self._pool.putconn(conn, close=bool(conn.closed))
+
+    def close(self):
+        """Fecha todas as conexões do pool"""
+        if self._pool is not None and not self._pool.closed:
+            self._pool.closeall()
+
+    def get_table_columns(self):
+        """
+        Retorna as colunas de amazon_offers (consulta o catálogo uma vez)
+
+        Só resultados bem-sucedidos ficam em cache: se a consulta falhar,
+        a próxima chamada tenta de novo.
+
+        Returns:
+            list: Tuplas (column_name, data_type, is_nullable), ou [] em erro
+        """
+        if self._table_columns is not None:
+            return self._table_columns
+
+        conn = None
+        try:
+            conn = self.connect()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT column_name, data_type, is_nullable
+                FROM information_schema.columns
+                WHERE table_name = 'amazon_offers'
+                ORDER BY ordinal_position
+            """)
+            self._table_columns = cursor.fetchall()
+            return self._table_columns
+
+        except psycopg2.Error as e:
+            logger.error(f"❌ Erro ao ler colunas de amazon_offers: {e}")
+            return []
+
+        finally:
+            if conn:
+                cursor.close()
+                self.release(conn)
+
+    def _offer_queries(self):
+        """Queries de UPSERT só com os campos de OFFER_FIELDS que existem na tabela"""
+        existing = {name for name, _, _ in self.get_table_columns()}
+        if not existing:
+            return build_offer_queries()
+        return build_offer_queries(tuple(field for field in OFFER_FIELDS if field in existing))
 
     def _normalize_url(self, url):
         """Normaliza URL para comparação (remove query params)"""
         return get_base_url(url)
 
-    def insert_offer(self, offer_data):
+    def _validate_offer(self, offer_data):
+        """
+        Valida o link de afiliado antes de gravar
+
+        Returns:
+            bool: True se a oferta pode ser gravada
+        """
+        # Validação 1: não inserir ofertas sem link afiliado
+        if not offer_data.get('affiliate_url'):
+            logger.warning(f"Oferta sem link afiliado ignorada: {offer_data['product_name'][:50]}...")
+            return False
+
+        # Validação 2: URL deve começar com http
+        affiliate_url = offer_data.get('affiliate_url', '').strip()
+        if not affiliate_url.startswith(('http://', 'https://')):
+            logger.warning(f"URL inválida (não é link): {affiliate_url[:50]}... | Produto: {offer_data['product_name'][:30]}...")
+            return False
+
+        # Validação 3: não pode ser um aviso/erro
+        marker_match = INVALID_LINK_MARKERS_RE.search(affiliate_url)
+        if marker_match:
+            logger.warning(f"URL contém marcador de erro ({marker_match.group(0)}): {affiliate_url[:50]}... | Produto: {offer_data['product_name'][:30]}...")
+            return False
+
+        return True
+
+    def ensure_schema(self):
+        """
+        Garante as colunas e os índices de amazon_offers usados pelo scraper
+
+        url_base é uma coluna gerada (SPLIT_PART(original_url, '?', 1)) com
+        índice B-tree único: a busca por URL_BASE em insert_offer vira um
+        index lookup e o ON CONFLICT de insert_offers_bulk usa o mesmo índice.
+
+        Cada canal ganha um índice parcial em created_at DESC restrito a
+        status_<canal> = 'new': get_offers_to_send lê só as primeiras
+        entradas do índice em vez de ordenar a tabela inteira. claimed_at_<canal>
+        (com índice parcial em status_<canal> = 'claimed') marca quando a
+        oferta foi reservada, para reservas vencidas voltarem a 'new'.
+
+        Antes de criar o índice único, remove duplicatas de url_base deixadas
+        pelo fluxo antigo (mantém a oferta mais recente de cada produto).
+
+        Consulta o catálogo primeiro e só executa DDL (locks fortes em
+        amazon_offers, exige ser dono da tabela) para o que estiver faltando:
+        execuções normais fazem apenas a leitura do catálogo.
+
+        Returns:
+            bool: True se o schema está pronto
         """
-        Insere ou atualiza uma oferta no banco seguindo a lógica:
+        columns = {
+            'url_base': """
+                ALTER TABLE amazon_offers
+                ADD COLUMN url_base TEXT
+                GENERATED ALWAYS AS (SPLIT_PART(original_url, '?', 1)) STORED
+            """,
+        }
+        indexes = {
+            'amazon_offers_url_base_idx': """
+                CREATE UNIQUE INDEX amazon_offers_url_base_idx
+                ON amazon_offers (url_base)
+            """,
+        }
+        for channel in SEND_CHANNELS:
+            columns[f'claimed_at_{channel}'] = f"""
+                ALTER TABLE amazon_offers
+                ADD COLUMN claimed_at_{channel} TIMESTAMPTZ
+            """
+            indexes[f'amazon_offers_{channel}_new_idx'] = f"""
+                CREATE INDEX amazon_offers_{channel}_new_idx
+                ON amazon_offers (created_at DESC)
+                WHERE status_{channel} = 'new'
+            """
+            indexes[f'amazon_offers_{channel}_claimed_idx'] = f"""
+                CREATE INDEX amazon_offers_{channel}_claimed_idx
+                ON amazon_offers (claimed_at_{channel})
+                WHERE status_{channel} = 'claimed'
+            """
+
+        conn = None
+        cursor = None
+        try:
+            conn = self.connect()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT
+                    ARRAY(
+                        SELECT name FROM unnest(%s::text[]) AS name
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM information_schema.columns
+                            WHERE table_name = 'amazon_offers' AND column_name = name
+                        )
+                    ),
+                    ARRAY(
+                        SELECT name FROM unnest(%s::text[]) AS name
+                        WHERE to_regclass(name) IS NULL
+                    )
+            """, (list(columns), list(indexes)))
+            missing_columns, missing_indexes = cursor.fetchone()
+            conn.commit()
+
+            if not missing_columns and not missing_indexes:
+                return True
+
+            logger.info(f"🛠️ Migrando schema de amazon_offers: {', '.join(missing_columns + missing_indexes)}")
+            # Colunas antes dos índices que dependem delas
+            for name in missing_columns:
+                cursor.execute(columns[name])
+            if 'amazon_offers_url_base_idx' in missing_indexes:
+                # Linhas antigas com o mesmo url_base impediriam o índice único:
+                # mantém só a mais recente de cada produto
+                cursor.execute("""
+                    DELETE FROM amazon_offers a
+                    USING amazon_offers b
+                    WHERE a.url_base = b.url_base
+                      AND (COALESCE(a.created_at, '-infinity'), a.id)
+                        < (COALESCE(b.created_at, '-infinity'), b.id)
+                """)
+                if cursor.rowcount:
+                    logger.warning(f"🧹 {cursor.rowcount} ofertas duplicadas (mesmo url_base) removidas")
+            for name in missing_indexes:
+                cursor.execute(indexes[name])
+            conn.commit()
+            return True
+
+        except psycopg2.Error as e:
+            logger.error(f"❌ Erro ao migrar schema de amazon_offers (sem permissão?): {e}")
+            if conn:
+                conn.rollback()
+            return False
+
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                self.release(conn)
+
+    def insert_offer(self, offer_data, now=None):
+        """
+        Insere ou atualiza uma oferta no banco seguindo a lógica abaixo,
+        resolvida em um único UPSERT (INSERT ... ON CONFLICT (url_base)):
 
         CHAVE DE IDENTIFICAÇÃO: URL_BASE (sem query params)
 
@@ -95,171 +495,51 @@ class AmazonDatabaseManager:
                 - category
                 - source_url
                 - scrape_type
+            now (datetime): Timestamp a gravar (reutilizado em lotes);
+                padrão: agora no timezone do Brasil
 
         Returns:
             str: 'inserted', 'updated', 'ignored', ou 'error'
         """
         conn = None
         try:
-            # Validação 1: não inserir ofertas sem link afiliado
-            if not offer_data.get('affiliate_url'):
-                logger.warning(f"Oferta sem link afiliado ignorada: {offer_data['product_name'][:50]}...")
-                return 'error'
-
-            # Validação 2: URL deve começar com http
-            affiliate_url = offer_data.get('affiliate_url', '').strip()
-            if not affiliate_url.startswith('http://') and not affiliate_url.startswith('https://'):
-                logger.warning(f"URL inválida (não é link): {affiliate_url[:50]}... | Produto: {offer_data['product_name'][:30]}...")
+            if not self._validate_offer(offer_data):
                 return 'error'
 
-            # Validação 3: não pode ser um aviso/erro
-            invalid_markers = ['⚠️', '❌', 'erro', 'error', 'não é permitido', 'não permitido', 'indisponível']
-            affiliate_lower = affiliate_url.lower()
-            for marker in invalid_markers:
-                if marker.lower() in affiliate_lower:
-                    logger.warning(f"URL contém marcador de erro ({marker}): {affiliate_url[:50]}... | Produto: {offer_data['product_name'][:30]}...")
-                    return 'error'
-
             conn = self.connect()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor = conn.cursor()
 
             # Hora atual no timezone do Brasil
-            now_brazil = datetime.now(BRAZIL_TZ)
+            now_brazil = now or datetime.now(BRAZIL_TZ)
+
+            # Um único UPSERT por URL_BASE (sem SELECT prévio)
+            params = self._build_offer_params(offer_data, now_brazil)
+            queries = self._offer_queries()
+            self._prepare_offer_upsert(conn, queries)
+            values = tuple(params[name] for name in queries['param_names'])
+            cursor.execute(queries['execute'], values)
+            result = cursor.fetchone()
+            conn.commit()
 
-            # Normalizar URL para comparação (URL_BASE = sem query params)
-            url_base = self._normalize_url(offer_data.get('original_url', ''))
             sale_price = offer_data.get('sale_price')
+            new_price = float(sale_price) if sale_price else None
 
-            # Verificar se produto já existe (buscar por URL_BASE)
-            check_query = """
-                SELECT id, sale_price,
-                       SPLIT_PART(original_url, '?', 1) as url_base
-                FROM amazon_offers
-                WHERE SPLIT_PART(original_url, '?', 1) = %s
-                LIMIT 1
-            """
-            cursor.execute(check_query, (url_base,))
-            existing = cursor.fetchone()
-
-            if existing:
-                # Produto já existe - verificar se preço mudou
-                existing_price = float(existing['sale_price']) if existing['sale_price'] else None
-                new_price = float(sale_price) if sale_price else None
-
-                if existing_price == new_price:
-                    # Preço igual → IGNORAR
-                    logger.info(f"  ⏭️ IGNORADO (mesmo preço R${existing_price}): {offer_data['product_name'][:40]}...")
-                    return 'ignored'
-                else:
-                    # Preço diferente → ATUALIZAR com status "new"
-                    logger.info(f"  🔄 Preço alterado! R${existing_price} → R${new_price}")
-
-                    update_query = """
-                        UPDATE amazon_offers SET
-                            product_name = %(product_name)s,
-                            affiliate_url = %(affiliate_url)s,
-                            image_url = %(image_url)s,
-                            asin = %(asin)s,
-                            list_price = %(list_price)s,
-                            sale_price = %(sale_price)s,
-                            discount_percentage = %(discount_percentage)s,
-                            has_coupon = %(has_coupon)s,
-                            coupon_code = %(coupon_code)s,
-                            coupon_discount = %(coupon_discount)s,
-                            promotion_text = %(promotion_text)s,
-                            prime_eligible = %(prime_eligible)s,
-                            shipping_info = %(shipping_info)s,
-                            installment_info = %(installment_info)s,
-                            rating = %(rating)s,
-                            review_count = %(review_count)s,
-                            category = %(category)s,
-                            source_url = %(source_url)s,
-                            scrape_type = %(scrape_type)s,
-                            -- Resetar status para reenvio
-                            status_telegram = 'new',
-                            status_whatsapp = 'new',
-                            status_tiktok = 'new',
-                            sent_at_telegram = NULL,
-                            sent_at_whatsapp = NULL,
-                            sent_at_tiktok = NULL,
-                            updated_at = %(now)s
-                        WHERE id = %(existing_id)s
-                    """
-
-                    params = self._build_offer_params(offer_data, now_brazil)
-                    params['existing_id'] = existing['id']
-
-                    cursor.execute(update_query, params)
-                    conn.commit()
-
-                    logger.info(f"✅ Oferta ATUALIZADA (preço alterado): {offer_data['product_name'][:50]}...")
-                    return 'updated'
-            else:
-                # Produto não existe → INSERIR
-                insert_query = """
-                    INSERT INTO amazon_offers (
-                        product_name,
-                        original_url,
-                        affiliate_url,
-                        image_url,
-                        asin,
-                        list_price,
-                        sale_price,
-                        discount_percentage,
-                        has_coupon,
-                        coupon_code,
-                        coupon_discount,
-                        promotion_text,
-                        prime_eligible,
-                        shipping_info,
-                        installment_info,
-                        rating,
-                        review_count,
-                        category,
-                        source_url,
-                        scrape_type,
-                        status_telegram,
-                        status_whatsapp,
-                        status_tiktok,
-                        created_at,
-                        updated_at
-                    )
-                    VALUES (
-                        %(product_name)s,
-                        %(original_url)s,
-                        %(affiliate_url)s,
-                        %(image_url)s,
-                        %(asin)s,
-                        %(list_price)s,
-                        %(sale_price)s,
-                        %(discount_percentage)s,
-                        %(has_coupon)s,
-                        %(coupon_code)s,
-                        %(coupon_discount)s,
-                        %(promotion_text)s,
-                        %(prime_eligible)s,
-                        %(shipping_info)s,
-                        %(installment_info)s,
-                        %(rating)s,
-                        %(review_count)s,
-                        %(category)s,
-                        %(source_url)s,
-                        %(scrape_type)s,
-                        'new',
-                        'new',
-                        'new',
-                        %(now)s,
-                        %(now)s
-                    )
-                """
-
-                params = self._build_offer_params(offer_data, now_brazil)
-                cursor.execute(insert_query, params)
-                conn.commit()
+            if result is None:
+                # URL_BASE existe com o mesmo preço → IGNORADO
+                logger.info(f"  ⏭️ IGNORADO (mesmo preço R${new_price}): {offer_data['product_name'][:40]}...")
+                return 'ignored'
 
+            was_inserted, previous_sale_price = result
+            if was_inserted:
                 logger.info(f"✅ Oferta INSERIDA: {offer_data['product_name'][:50]}...")
                 return 'inserted'
 
+            # Preço diferente → ATUALIZADO com status "new"
+            previous_price = float(previous_sale_price) if previous_sale_price else None
+            logger.info(f"  🔄 Preço alterado! R${previous_price} → R${new_price}")
+            logger.info(f"✅ Oferta ATUALIZADA (preço alterado): {offer_data['product_name'][:50]}...")
+            return 'updated'
+
         except psycopg2.Error as e:
             logger.error(f"❌ Erro ao inserir oferta no banco: {e}")
             if conn:
@@ -277,7 +557,140 @@ class AmazonDatabaseManager:
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self.release(conn)
+
+    def _prepare_offer_upsert(self, conn, queries):
+        """
+        Prepara o UPSERT de oferta na conexão (uma vez por sessão do Postgres
+        e conjunto de campos)
+
+        Se o conjunto de campos mudou (ex: get_table_columns falhou antes e
+        agora retornou só parte de OFFER_FIELDS), o statement antigo é
+        descartado e preparado de novo: o EXECUTE precisa do mesmo número
+        de parâmetros do PREPARE.
+        """
+        if conn.offer_upsert_fields == queries['fields']:
+            return
+
+        cursor = conn.cursor()
+        if conn.offer_upsert_fields is not None:
+            cursor.execute(f"DEALLOCATE {PREPARED_OFFER_UPSERT}")
+        cursor.execute(queries['prepare'])
+        cursor.close()
+        # PREPARE não é transacional: continua válido mesmo após rollback
+        conn.offer_upsert_fields = queries['fields']
+
+    def insert_offers_bulk(self, offers, now=None):
+        """
+        Insere/atualiza várias ofertas com um único UPSERT e um único commit
+
+        Mesma lógica de insert_offer (chave URL_BASE + sale_price), mas
+        resolvida pelo Postgres via ON CONFLICT em vez de SELECT por oferta:
+        - Linha nova → INSERIR
+        - URL_BASE existente com sale_price diferente → ATUALIZAR (status 'new')
+        - URL_BASE existente com mesmo sale_price → IGNORAR (nada retornado)
+
+        Lotes com BULK_COPY_THRESHOLD ofertas ou mais vão para bulk_load (COPY).
+        Requer o índice criado por ensure_schema().
+
+        Args:
+            offers (list): Lista de dicionários no formato de insert_offer
+            now (datetime): Timestamp único para todo o lote (padrão: agora)
+
+        Returns:
+            dict: Contagem por resultado ('inserted', 'updated', 'ignored', 'error')
+        """
+        if len(offers) >= BULK_COPY_THRESHOLD:
+            return self.bulk_load(offers, now)
+        return self._upsert_many(offers, now, self._write_values)
+
+    def bulk_load(self, offers, now=None):
+        """
+        Carga grande de ofertas via COPY FROM STDIN
+
+        As linhas vão por COPY (CSV) para uma tabela temporária e entram em
+        amazon_offers com um INSERT ... SELECT usando o mesmo UPSERT de
+        insert_offers_bulk, tudo na mesma transação.
+
+        Args:
+            offers (list): Lista de dicionários no formato de insert_offer
+            now (datetime): Timestamp único para todo o lote (padrão: agora)
+
+        Returns:
+            dict: Contagem por resultado ('inserted', 'updated', 'ignored', 'error')
+        """
+        return self._upsert_many(offers, now, self._write_copy)
+
+    def _upsert_many(self, offers, now, write):
+        """Valida, deduplica e grava um lote com `write`, contando os resultados"""
+        counts = {'inserted': 0, 'updated': 0, 'ignored': 0, 'error': 0}
+
+        # Deduplicar por URL_BASE dentro do lote (ON CONFLICT não aceita a
+        # mesma linha duas vezes no mesmo comando) - a última ocorrência vence
+        by_base = {}
+        for offer_data in offers:
+            if not self._validate_offer(offer_data):
+                counts['error'] += 1
+                continue
+            url_base = self._normalize_url(offer_data.get('original_url', ''))
+            if url_base in by_base:
+                counts['ignored'] += 1
+            by_base[url_base] = offer_data
+
+        if not by_base:
+            return counts
+
+        now_brazil = now or datetime.now(BRAZIL_TZ)
+        rows = [self._build_offer_params(offer_data, now_brazil) for offer_data in by_base.values()]
+
+        conn = None
+        try:
+            conn = self.connect()
+            cursor = conn.cursor()
+
+            results = write(cursor, rows, self._offer_queries(), now_brazil)
+            conn.commit()
+
+            inserted = sum(1 for (was_inserted,) in results if was_inserted)
+            counts['inserted'] += inserted
+            counts['updated'] += len(results) - inserted
+            counts['ignored'] += len(rows) - len(results)
+
+            logger.info(
+                f"✅ Lote gravado: {counts['inserted']} inseridas, {counts['updated']} atualizadas, "
+                f"{counts['ignored']} ignoradas, {counts['error']} inválidas"
+            )
+            return counts
+
+        except psycopg2.Error as e:
+            logger.error(f"❌ Erro ao inserir lote de ofertas no banco: {e}")
+            if conn:
+                conn.rollback()
+            counts['error'] += len(rows)
+            return counts
+
+        finally:
+            if conn:
+                cursor.close()
+                self.release(conn)
+
+    def _write_values(self, cursor, rows, queries, now_brazil):
+        """Grava o lote com INSERT ... VALUES multi-linha (execute_values)"""
+        return execute_values(cursor, queries['bulk'], rows, template=queries['template'],
+                              page_size=BULK_PAGE_SIZE, fetch=True)
+
+    def _write_copy(self, cursor, rows, queries, now_brazil):
+        """Grava o lote com COPY em tabela temporária + INSERT ... SELECT"""
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(','.join(_csv_value(row[field]) for field in queries['fields']))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        cursor.execute(queries['copy_staging'])
+        cursor.copy_expert(queries['copy'], buffer)
+        cursor.execute(queries['copy_upsert'], {'now': now_brazil})
+        return cursor.fetchall()
 
     def _build_offer_params(self, offer_data, now_brazil):
         """Constrói dicionário de parâmetros para INSERT/UPDATE"""
@@ -305,16 +718,25 @@ class AmazonDatabaseManager:
             'now': now_brazil
         }
 
-    def get_offers_to_send(self, channel='telegram', limit=10):
+    def get_offers_to_send(self, channel='telegram', limit=10, claim_timeout=CLAIM_TIMEOUT_MINUTES):
         """
-        Busca ofertas pendentes de envio para um canal específico
+        Reserva ofertas pendentes de envio para um canal específico
+
+        Busca e reserva em um único UPDATE ... RETURNING: as ofertas passam de
+        'new' para 'claimed' no canal (com claimed_at_<canal> = NOW()).
+        FOR UPDATE SKIP LOCKED faz workers concorrentes pegarem lotes
+        disjuntos, sem enviar a mesma oferta duas vezes.
+        Depois do envio, confirme com mark_as_sent; se o envio falhar, devolva
+        com release_claims. Reservas mais antigas que claim_timeout (worker
+        que caiu no meio do envio) voltam para 'new' antes da nova reserva.
 
         Args:
             channel (str): Canal de envio ('telegram', 'whatsapp', 'tiktok')
             limit (int): Número máximo de ofertas a retornar
+            claim_timeout (int): Minutos até uma reserva não confirmada vencer
 
         Returns:
-            list: Lista de dicionários com dados das ofertas
+            list: Lista de dicionários com dados das ofertas (created_at DESC)
         """
         conn = None
         try:
@@ -322,47 +744,137 @@ class AmazonDatabaseManager:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
 
             status_column = f"status_{channel}"
+            claimed_at_column = f"claimed_at_{channel}"
 
+            # Reservas vencidas voltam para a fila
+            cursor.execute(f"""
+            UPDATE amazon_offers
+            SET {status_column} = 'new',
+                {claimed_at_column} = NULL
+            WHERE {status_column} = 'claimed'
+              AND {claimed_at_column} < NOW() - make_interval(mins => %s)
+            """, (claim_timeout,))
+            if cursor.rowcount:
+                logger.info(f"♻️ {cursor.rowcount} reserva(s) vencida(s) devolvida(s) para {channel}")
+
+            # RETURNING não garante ordem: reordenar o resultado do UPDATE
             query = f"""
-            SELECT *
-            FROM amazon_offers
-            WHERE {status_column} = 'new'
+            WITH claimed AS (
+                UPDATE amazon_offers
+                SET {status_column} = 'claimed',
+                    {claimed_at_column} = NOW()
+                WHERE id IN (
+                    SELECT id
+                    FROM amazon_offers
+                    WHERE {status_column} = 'new'
+                    ORDER BY created_at DESC
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING *
+            )
+            SELECT * FROM claimed
             ORDER BY created_at DESC
-            LIMIT %s
             """
 
             cursor.execute(query, (limit,))
             offers = cursor.fetchall()
+            conn.commit()
 
-            logger.info(f"📊 Encontradas {len(offers)} ofertas pendentes para {channel}")
+            logger.info(f"📊 Reservadas {len(offers)} ofertas pendentes para {channel}")
             return offers
 
         except psycopg2.Error as e:
             logger.error(f"❌ Erro ao buscar ofertas: {e}")
+            if conn:
+                conn.rollback()
             return []
 
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self.release(conn)
 
-    def mark_as_sent(self, offer_id, channel='telegram'):
+    def release_claims(self, offer_ids, channel='telegram'):
         """
-        Marca uma oferta como enviada em um canal específico
+        Devolve para 'new' ofertas reservadas cujo envio falhou
 
         Args:
-            offer_id (int): ID da oferta
+            offer_ids (int | list): ID da oferta ou lista de IDs (um único UPDATE)
             channel (str): Canal de envio ('telegram', 'whatsapp', 'tiktok')
 
         Returns:
             bool: True se atualizou com sucesso
         """
+        if isinstance(offer_ids, int):
+            offer_ids = [offer_ids]
+        else:
+            offer_ids = list(offer_ids)
+
+        if not offer_ids:
+            return True
+
         conn = None
         try:
             conn = self.connect()
             cursor = conn.cursor()
 
-            now_brazil = datetime.now(BRAZIL_TZ)
+            status_column = f"status_{channel}"
+            claimed_at_column = f"claimed_at_{channel}"
+
+            query = f"""
+            UPDATE amazon_offers
+            SET {status_column} = 'new',
+                {claimed_at_column} = NULL
+            WHERE id = ANY(%s)
+              AND {status_column} = 'claimed'
+            """
+
+            cursor.execute(query, (offer_ids,))
+            conn.commit()
+
+            logger.info(f"♻️ {cursor.rowcount} oferta(s) devolvida(s) para a fila de {channel}")
+            return True
+
+        except psycopg2.Error as e:
+            logger.error(f"❌ Erro ao devolver ofertas reservadas: {e}")
+            if conn:
+                conn.rollback()
+            return False
+
+        finally:
+            if conn:
+                cursor.close()
+                self.release(conn)
+
+    def mark_as_sent(self, offer_ids, channel='telegram', now=None):
+        """
+        Marca ofertas como enviadas em um canal específico
+        Só confirma ofertas ainda 'claimed': se o UPSERT devolveu a oferta para
+        'new' (preço mudou) durante o envio, ela volta para a fila
+
+        Args:
+            offer_ids (int | list): ID da oferta ou lista de IDs (um único UPDATE)
+            channel (str): Canal de envio ('telegram', 'whatsapp', 'tiktok')
+            now (datetime): Timestamp de envio (padrão: agora)
+
+        Returns:
+            bool: True se atualizou com sucesso
+        """
+        if isinstance(offer_ids, int):
+            offer_ids = [offer_ids]
+        else:
+            offer_ids = list(offer_ids)
+
+        if not offer_ids:
+            return True
+
+        conn = None
+        try:
+            conn = self.connect()
+            cursor = conn.cursor()
+
+            now_brazil = now or datetime.now(BRAZIL_TZ)
 
             status_column = f"status_{channel}"
             sent_at_column = f"sent_at_{channel}"
@@ -371,13 +883,14 @@ class AmazonDatabaseManager:
             UPDATE amazon_offers
             SET {status_column} = 'sent',
                 {sent_at_column} = %s
-            WHERE id = %s
+            WHERE id = ANY(%s)
+              AND {status_column} = 'claimed'
             """
 
-            cursor.execute(query, (now_brazil, offer_id))
+            cursor.execute(query, (now_brazil, offer_ids))
             conn.commit()
 
-            logger.info(f"✅ Oferta {offer_id} marcada como enviada em {channel}")
+            logger.info(f"✅ {cursor.rowcount} oferta(s) marcada(s) como enviada(s) em {channel}")
             return True
 
         except psycopg2.Error as e:
@@ -389,10 +902,11 @@ class AmazonDatabaseManager:
         finally:
             if conn:
                 cursor.close()
-                conn.close()
+                self.release(conn)
 
     def test_connection(self):
         """Testa conexão com o banco de dados"""
+        conn = None
         try:
             conn = self.connect()
             cursor = conn.cursor()
@@ -400,8 +914,10 @@ class AmazonDatabaseManager:
             version = cursor.fetchone()
             logger.info(f"✅ Conexão com banco OK: {version[0]}")
             cursor.close()
-            conn.close()
             return True
         except Exception as e:
             logger.error(f"❌ Erro ao conectar ao banco: {e}")
             return False
+        finally:
+            if conn:
+                self.release(conn)
@@ -0,0 +1,91 @@
+"""
+Extração dos dados da página de produto da Amazon
+Compartilhado entre scraper.py e test_price_capture.py: um único
+page.evaluate lê todos os campos e o parse roda em Python
+"""
+from functools import lru_cache
+
+
+# "R$ 1.234,56" -> "1234.56" em um único str.translate
+_PRICE_TRANS = str.maketrans({'R': None, '$': None, ' ': None, '\xa0': None, '.': None, ',': '.'})
+
+# Primeiro elemento que a extração da página do produto usa
+PRICE_BLOCK_SELECTOR = 'span.priceToPay span.a-price-whole, #corePrice_feature_div span.a-offscreen'
+
+# Campos da página do produto em um único round-trip
+EXTRACT_JS = """
+() => {
+    const q = sel => document.querySelector(sel);
+    const text = sel => { const el = q(sel); return el ? el.innerText : null; };
+    const listPrice = q('span.a-price.a-text-price[data-a-strike="true"] span.a-offscreen')
+        || q('.basisPrice span.a-offscreen');
+    const shipping = q('span[data-csa-c-delivery-price]');
+    const promo = q('span.promoPriceBlockMessage');
+    return {
+        whole: text('span.priceToPay span.a-price-whole'),
+        fraction: text('span.priceToPay span.a-price-fraction'),
+        offscreen: text('#corePrice_feature_div span.a-offscreen, #corePriceDisplay_desktop_feature_div span.a-offscreen'),
+        list_price: listPrice ? listPrice.innerText : null,
+        installment: text('#best-offer-string-cc'),
+        delivery_price: shipping ? shipping.getAttribute('data-csa-c-delivery-price') : null,
+        delivery_time: shipping ? shipping.getAttribute('data-csa-c-delivery-time') : null,
+        // [badge, mensagem] de cada promoção
+        promos: promo ? Array.from(promo.querySelectorAll('div[style*="padding"]'), div => {
+            const badge = div.querySelector('label[id^="greenBadge"]');
+            const message = div.querySelector('span[id^="promoMessage"]');
+            return [badge ? badge.innerText : null, message ? message.innerText : null];
+        }) : [],
+    };
+}
+"""
+
+
+async def extract_product_details(page):
+    """
+    Lê os campos da página do produto em um único round-trip
+
+    Args:
+        page: Página Playwright já na página do produto
+
+    Returns:
+        dict: whole, fraction, offscreen, list_price, installment,
+              delivery_price, delivery_time e promos ([badge, mensagem])
+    """
+    return await page.evaluate(EXTRACT_JS)
+
+
+@lru_cache(maxsize=4096)
+def parse_price(price_text):
+    """
+    Converte texto de preço para float
+    Exemplo: "R$ 1.234,56" -> 1234.56
+
+    Memoizado: os mesmos textos de preço ("R$ 99,90") se repetem entre produtos
+    """
+    if not price_text:
+        return None
+
+    try:
+        # Remover R$, espaços e milhar e converter vírgula para ponto (uma passada)
+        return float(price_text.translate(_PRICE_TRANS))
+    except (ValueError, AttributeError):
+        return None
+
+
+def parse_price_from_parts(whole, fraction):
+    """
+    Converte as partes inteira e decimal de span.priceToPay para float
+    Exemplo: ("1.234", "56") -> 1234.56
+
+    Returns:
+        float: Preço ou None se alguma parte estiver vazia/inválida
+    """
+    whole_text = whole.replace(',', '').replace('.', '').replace('\n', '').strip()
+    fraction_text = fraction.replace('\n', '').strip()
+    if not whole_text or not fraction_text:
+        return None
+
+    try:
+        return float(f"{whole_text}.{fraction_text}")
+    except ValueError:
+        return None
@@ -6,49 +6,303 @@ gera links de afiliado via SiteStripe e salva no banco de dados.
 import os
 import sys
 import json
-import yaml
 import time
+import shelve
+import argparse
+import yaml
+import atexit
+import asyncio
 import logging
 import re
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from queue import SimpleQueue
 from datetime import datetime
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
-from bs4 import BeautifulSoup
+from playwright.async_api import async_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeout
+import httpx
+import lxml.html
+from lxml import etree
+
+# Loader do PyYAML em C (libyaml) quando disponível
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
 
 # Importar módulos locais
 from db_manager import AmazonDatabaseManager
 from capture_session import AmazonSessionCapture
-
-load_dotenv()
+from browser_flags import CHROMIUM_ARGS
+from extract import PRICE_BLOCK_SELECTOR, extract_product_details, parse_price, parse_price_from_parts
 
 # Configurar logging
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Escrita em disco numa thread própria: o event loop só enfileira o registro
+_file_handler = logging.FileHandler(
+    f'logs/scraper_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log',
+    encoding='utf-8'
+)
+_file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+_log_queue = SimpleQueue()
+_log_listener = QueueListener(_log_queue, _file_handler)
+_queue_handler = QueueHandler(_log_queue)
+# Só a mensagem: o FileHandler do listener aplica LOG_FORMAT
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format=LOG_FORMAT,
     handlers=[
         logging.StreamHandler(sys.stdout),
-        logging.FileHandler(
-            f'logs/scraper_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log',
-            encoding='utf-8'
-        )
+        _queue_handler
     ]
 )
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
+# Valores aceitos em LOG_LEVEL (.env)
+LOG_LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+# Regexes pré-compiladas usadas por card/URL
+_ASIN_RES = (
+    re.compile(r'/dp/([A-Z0-9]{10})'),
+    re.compile(r'/gp/product/([A-Z0-9]{10})'),
+    re.compile(r'ASIN=([A-Z0-9]{10})'),
+)
+_DISCOUNT_RE = re.compile(r'(\d+)%')
+_RATING_RE = re.compile(r'([\d,]+)\s+de\s+5')
+_NON_DIGITS_RE = re.compile(r'[^\d]')
+_RANK_RE = re.compile(r'#?(\d+)')
+# Links "Ver itens participantes"/"Termos" removidos do texto das promoções
+_PROMO_CLEAN_RE = re.compile(r'\s*(Ver itens participantes|Termos)\s*')
+
+# Falhas esperadas ao montar um card (campo ausente/mal formatado); o resto propaga
+CARD_ERRORS = (AttributeError, KeyError, TypeError, ValueError)
+
+
+@lru_cache(maxsize=8192)
+def _extract_asin(url):
+    """Extrai ASIN de uma URL da Amazon (memoizado: links se repetem entre páginas)"""
+    for pattern in _ASIN_RES:
+        match = pattern.search(url)
+        if match:
+            return match.group(1)
+    return None
+
+
+@lru_cache(maxsize=None)
+def _read_config(config_path):
+    """Lê e parseia o YAML de configuração uma vez por processo"""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=YamlLoader)
+
+
+def _has_class(name):
+    """Predicado XPath equivalente ao seletor CSS .name"""
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+# XPaths pré-compilados (libxml2) para os cards de Best Sellers
+_XP_DP_LINK = etree.XPath('.//a[contains(@href, "/dp/")]')
+_XP_IMG_ALT = etree.XPath('.//img[@alt]')
+
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+DEAL_CARD_SELECTOR = 'div[data-testid="product-card"]'
+BESTSELLER_CARD_SELECTOR = 'div[data-asin]'
+
+# Chave "quantidade:último ASIN" dos cards; muda quando o grid renderiza
+# cards novos (inclusive no grid virtualizado, que recicla os nós)
+CARDS_KEY_JS = """
+(selector) => {
+    const cards = document.querySelectorAll(selector);
+    const last = cards.length ? cards[cards.length - 1].getAttribute('data-asin') || '' : '';
+    return `${cards.length}:${last}`;
+}
+"""
+
+CARDS_CHANGED_JS = f"([selector, previous]) => ({CARDS_KEY_JS.strip()})(selector) !== previous"
+
+# Leitura de todos os cards em um único round-trip (page.evaluate)
+DEAL_CARDS_JS = """
+(known) => {
+    const seen = new Set(known);
+    const all = document.querySelectorAll('div[data-testid="product-card"]');
+    const last = all.length ? all[all.length - 1].getAttribute('data-asin') || '' : '';
+    const cards = [];
+    let duplicates = 0;
+    for (const card of all) {
+        const asin = card.getAttribute('data-asin');
+        if (!asin) continue;
+        // Cards já coletados não são serializados de volta para o Python
+        if (seen.has(asin)) { duplicates++; continue; }
+        seen.add(asin);
+        const text = sel => { const el = card.querySelector(sel); return el ? el.innerText : null; };
+        const link = card.querySelector('a[href*="/dp/"]')
+            || card.querySelector('a[data-testid="product-card-link"]');
+        const img = card.querySelector('img[alt]');
+        cards.push({
+            asin: asin,
+            href: link ? link.getAttribute('href') : null,
+            alt: img ? img.getAttribute('alt') : null,
+            src: img ? img.getAttribute('src') : null,
+            title_full: text('span.a-truncate-full'),
+            title_p: text('p[id^="title-"]'),
+            prices: Array.from(card.querySelectorAll('span.a-offscreen'), el => el.innerText),
+            discount: text('div[data-component="dui-badge"] span.a-size-mini'),
+            promo: text('.style_badgeMessage__xR2lh span'),
+        });
+    }
+    return {key: `${all.length}:${last}`, total: all.length, duplicates: duplicates, cards: cards};
+}
+"""
+
+BESTSELLER_CARDS_JS = """
+() => Array.from(document.querySelectorAll('div[data-asin]'), card => {
+    const text = sel => { const el = card.querySelector(sel); return el ? el.innerText : null; };
+    const link = card.querySelector('a[href*="/dp/"]');
+    const alt = card.querySelector('img[alt]');
+    const img = card.querySelector('img.p13n-product-image, img.p13n-sc-dynamic-image');
+    return {
+        asin: card.getAttribute('data-asin'),
+        href: link ? link.getAttribute('href') : null,
+        titles: [
+            text('div[class*="p13n-sc-css-line-clamp"]'),
+            text('span[class*="p13n-sc-css-line-clamp"]'),
+        ],
+        alt: alt ? alt.getAttribute('alt') : null,
+        src: img ? img.getAttribute('src') : null,
+        price: text('span[class*="p13n-sc-price"]'),
+        rating: text('i[class*="a-icon-star"] span.a-icon-alt'),
+        reviews: text('a[href*="/product-reviews/"] span.a-size-small'),
+        rank: text('span.zg-bdg-text'),
+    };
+})
+"""
+
+
+# Máximo de promoções distintas guardadas em promotion_text
+MAX_PROMOTIONS = 5
+
+# Campos da página do produto guardados no cache por ASIN (além do link)
+CACHED_PRODUCT_FIELDS = (
+    'list_price', 'sale_price', 'discount_percentage', 'installment_info',
+    'shipping_info', 'promotion_text', 'has_coupon',
+)
+
+# Link encurtado do textarea do SiteStripe, ou null enquanto não estiver pronto
+SHORTLINK_READY_JS = """
+() => {
+    const textarea = document.querySelector('#amzn-ss-text-shortlink-textarea');
+    return textarea !== null && textarea.value.includes('amzn.to') ? textarea.value : null;
+}
+"""
+
+
+def _first(xpath, element):
+    """Primeiro resultado de um XPath compilado (ou None)"""
+    found = xpath(element)
+    return found[0] if found else None
+
+
+# Best Sellers via HTTP: mesmos campos de BESTSELLER_CARDS_JS, extraídos com lxml.
+# O HTML do servidor pode trazer só parte dos BESTSELLER_PAGE_SIZE itens (o resto
+# carrega no scroll): com menos cards que o esperado, a página vai para o Playwright
+BESTSELLER_PAGE_SIZE = 50
+
+_XP_BESTSELLER_CARDS = etree.XPath('//div[@data-asin]')
+_XP_BS_TITLE_DIV = etree.XPath('.//div[contains(@class, "p13n-sc-css-line-clamp")]')
+_XP_BS_TITLE_SPAN = etree.XPath('.//span[contains(@class, "p13n-sc-css-line-clamp")]')
+_XP_BS_IMG = etree.XPath(
+    f'.//img[{_has_class("p13n-product-image")} or {_has_class("p13n-sc-dynamic-image")}]'
+)
+_XP_BS_PRICE = etree.XPath('.//span[contains(@class, "p13n-sc-price")]')
+_XP_BS_RATING = etree.XPath(f'.//i[contains(@class, "a-icon-star")]//span[{_has_class("a-icon-alt")}]')
+_XP_BS_REVIEWS = etree.XPath(
+    f'.//a[contains(@href, "/product-reviews/")]//span[{_has_class("a-size-small")}]'
+)
+_XP_BS_RANK = etree.XPath(f'.//span[{_has_class("zg-bdg-text")}]')
+
+
+def _text(xpath, element):
+    """Texto do primeiro resultado com espaços normalizados (como innerText)"""
+    found = _first(xpath, element)
+    return ' '.join(found.text_content().split()) if found is not None else None
+
+
+def _bestseller_card_from_element(card):
+    """Lê um card Best Sellers do HTML no mesmo formato de BESTSELLER_CARDS_JS"""
+    link = _first(_XP_DP_LINK, card)
+    alt = _first(_XP_IMG_ALT, card)
+    img = _first(_XP_BS_IMG, card)
+    return {
+        'asin': card.get('data-asin'),
+        'href': link.get('href') if link is not None else None,
+        'titles': [_text(_XP_BS_TITLE_DIV, card), _text(_XP_BS_TITLE_SPAN, card)],
+        'alt': alt.get('alt') if alt is not None else None,
+        'src': img.get('src') if img is not None else None,
+        'price': _text(_XP_BS_PRICE, card),
+        'rating': _text(_XP_BS_RATING, card),
+        'reviews': _text(_XP_BS_REVIEWS, card),
+        'rank': _text(_XP_BS_RANK, card),
+    }
+
 
 class AmazonScraper:
-    def __init__(self):
-        """Inicializa o scraper com configurações"""
+    def __init__(self, force_refresh=False, links_only=False):
+        """
+        Inicializa o scraper com configurações
+
+        Args:
+            force_refresh: Ignora o cache de links de afiliado e revisita todas as páginas de produto
+            links_only: Grava só com dados da listagem e link manual (sem abrir páginas de produto)
+        """
+        # Carregar .env uma única vez por processo (não no import do módulo)
+        if not os.environ.get('_ENV_LOADED'):
+            load_dotenv()
+            os.environ['_ENV_LOADED'] = '1'
+
+        # Nível de log do .env (LOG_LEVEL=DEBUG mostra o passo a passo de cada produto).
+        # Só no logger deste módulo: httpx/hpack/asyncio/psycopg continuam em INFO
+        log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
+        if log_level not in LOG_LEVELS:
+            logger.warning(f"⚠️ LOG_LEVEL inválido ({log_level}), usando INFO")
+            log_level = 'INFO'
+        logger.setLevel(log_level)
+
         self.config = self._load_config()
         self.db = AmazonDatabaseManager()
         self.session_capturer = AmazonSessionCapture()
+        self._session_state = None  # Storage state da sessão (carregado uma vez)
 
         # Configurações de scraping
-        self.selectors = self.config['scraping_settings']['selectors']
         self.delays = self.config['scraping_settings']['delays']
         self.timeouts = self.config['scraping_settings']['timeouts']
 
+        # Valores lidos por produto resolvidos uma vez
+        self._associate_tag = os.getenv('AMAZON_ASSOCIATE_TAG', '')
+        self._t_page_load = self.timeouts['page_load']
+        self._t_price_wait = self.timeouts['price_wait']
+        self._t_sitestripe_wait = self.timeouts['sitestripe_wait']
+        self._d_between_products = self.delays['between_products']
+
+        # Tipos de recurso bloqueados no navegador (image_url vem do atributo src)
+        navigation = self.config['scraping_settings']['navigation']
+        self.blocked_resource_types = frozenset(navigation.get('block_resource_types', []))
+        # Hosts de anúncios/rastreamento abortados (trecho contido na URL)
+        self.blocked_url_patterns = tuple(navigation.get('block_url_patterns', []))
+        # Páginas de produto: bloqueios extras (CSS, beacons da página do produto)
+        self.product_blocked_resource_types = self.blocked_resource_types | frozenset(
+            navigation.get('product_block_resource_types', []))
+        self.product_blocked_url_patterns = self.blocked_url_patterns + tuple(
+            navigation.get('product_block_url_patterns', []))
+
         # Estatísticas
         self.stats = {
             'urls_processed': 0,
@@ -59,193 +313,154 @@ class AmazonScraper:
             'errors': 0
         }
 
+        # Best Sellers via HTTP (httpx) antes de recorrer ao Playwright
+        self.bestseller_http = self.config['scraping_settings'].get('bestseller_http', True)
+        self.http_client = None
+
+        # Quantas URLs configuradas são processadas ao mesmo tempo
+        # (0 travaria o Semaphore: mínimo 1)
+        self.parallel_urls = max(1, self.config['scraping_settings'].get('parallel_urls', 3))
+
+        # Quantos produtos de uma URL são processados ao mesmo tempo (env CONCURRENCY
+        # tem prioridade sobre o config.yml; 0 deixaria o pool sem abas: mínimo 1)
+        product_concurrency = self.config['scraping_settings'].get('product_concurrency', 3)
+        env_concurrency = os.getenv('CONCURRENCY', '').strip()
+        if env_concurrency:
+            try:
+                product_concurrency = int(env_concurrency)
+            except ValueError:
+                logger.warning(f"⚠️ CONCURRENCY inválido ({env_concurrency}), usando {product_concurrency}")
+        self.product_concurrency = max(1, product_concurrency)
+
+        # Gerar o link com o tag direto, sem o clique no SiteStripe
+        self.prefer_manual_link = self.config['scraping_settings'].get('prefer_manual_affiliate_link', False)
+
+        # Modo links_only: nenhuma página de produto é aberta (--links-only tem prioridade)
+        self.links_only = links_only or self.config['scraping_settings'].get('mode') == 'links_only'
+
+        # Linha de progresso em INFO a cada log_every produtos
+        self.log_every = max(1, self.config['scraping_settings'].get('log_every', 10))
+
+        # Ofertas gravadas em lotes de até flush_every (e o restante ao fim da URL)
+        self.flush_every = self.config['scraping_settings'].get('flush_every', 50)
+
+        # Cache por ASIN do link de afiliado e dos dados da página do produto
+        cache_config = self.config['scraping_settings'].get('affiliate_cache', {})
+        self.cache_enabled = cache_config.get('enabled', True)
+        self.cache_path = cache_config.get('path', '.affiliate_cache')
+        self.cache_ttl = cache_config.get('ttl', 86400)
+        self.force_refresh = force_refresh
+        self.cache = None  # shelve aberto durante run()
+
     def _load_config(self):
         """Carrega configurações do arquivo YAML"""
         try:
-            config_path = Path('config.yml')
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+            return _read_config(Path('config.yml').resolve())
         except Exception as e:
             logger.error(f"❌ Erro ao carregar config.yml: {e}")
             sys.exit(1)
 
-    def _load_session(self, context):
-        """Carrega sessão salva no contexto do navegador"""
-        session_data = self.session_capturer.load_session()
+    def _storage_state(self):
+        """
+        Storage state da sessão salva (cookies + localStorage), lido do arquivo
+        uma única vez por execução e passado direto ao new_context
 
-        if not session_data:
-            logger.error("❌ Nenhuma sessão encontrada. Execute capture_session.py primeiro!")
-            return False
+        Returns:
+            dict: Storage state no formato do Playwright, ou None se não há sessão
+        """
+        if self._session_state is None:
+            session_data = self.session_capturer.load_session()
+            if session_data:
+                self._session_state = session_data['storage_state']
+                logger.info(f"✅ Sessão carregada com {len(self._session_state['cookies'])} cookies")
+        return self._session_state
+
+    def _session_cookies(self):
+        """
+        Cookies da sessão salva
 
-        try:
-            # Adicionar cookies ao contexto
-            context.add_cookies(session_data['cookies'])
-            logger.info(f"✅ Sessão carregada com {len(session_data['cookies'])} cookies")
-            return True
-        except Exception as e:
-            logger.error(f"❌ Erro ao carregar sessão: {e}")
-            return False
+        Returns:
+            list: Cookies no formato do Playwright, ou None se não há sessão
+        """
+        storage_state = self._storage_state()
+        return storage_state['cookies'] if storage_state else None
 
-    def extract_product_info(self, product_element, soup):
+    async def _launch_browser(self, p):
         """
-        Extrai informações de um elemento de produto
+        Conecta ao navegador já aberto por browser_server.py (BROWSER_CDP_URL)
+        ou, sem ele, inicia um Chromium local
 
         Args:
-            product_element: Elemento BeautifulSoup do produto
-            soup: BeautifulSoup da página completa
+            p: Instância do async_playwright
 
         Returns:
-            dict: Dicionários com dados do produto ou None
+            Browser: Navegador para os contextos das URLs
         """
-        try:
-            # ASIN diretamente do atributo data-asin
-            asin = product_element.get('data-asin')
-
-            # Link do produto (primeiro link com href)
-            link_elem = product_element.select_one(self.selectors['product_link'])
-            if not link_elem or not link_elem.get('href'):
-                # Tentar qualquer link
-                link_elem = product_element.select_one('a[href*="/dp/"]')
-
-            if not link_elem or not link_elem.get('href'):
-                return None
-
-            original_url = link_elem['href']
-            if not original_url.startswith('http'):
-                original_url = 'https://www.amazon.com.br' + original_url
-
-            # Se não pegou ASIN do atributo, extrair da URL
-            if not asin:
-                asin = self._extract_asin(original_url)
-
-            # Nome do produto - tentar múltiplos seletores
-            product_name = None
-
-            # Tentar pelo título padrão
-            title_elem = product_element.select_one(self.selectors['product_title'])
-            if title_elem:
-                product_name = title_elem.get_text(strip=True)
-
-            # Fallback: tentar pelo atributo alt da imagem
-            if not product_name:
-                img_elem = product_element.select_one('img[alt]')
-                if img_elem and img_elem.get('alt'):
-                    product_name = img_elem['alt']
-
-            # Fallback: tentar truncate-cut
-            if not product_name:
-                truncate_elem = product_element.select_one('span.a-truncate-cut')
-                if truncate_elem:
-                    product_name = truncate_elem.get_text(strip=True)
-
-            if not product_name:
-                return None
-
-            # Imagem
-            image_elem = product_element.select_one('img')
-            image_url = None
-            if image_elem:
-                image_url = image_elem.get('src') or image_elem.get('data-src')
-
-            # Preços - buscar todos os spans a-offscreen com preços
-            prices = []
-            for price_span in product_element.select('span.a-offscreen'):
-                price_text = price_span.get_text(strip=True)
-                if 'R$' in price_text:
-                    parsed = self._parse_price(price_text)
-                    if parsed:
-                        prices.append(parsed)
-
-            # Ordenar preços - menor é sale_price, maior é list_price
-            sale_price = None
-            list_price = None
-            if prices:
-                prices = sorted(set(prices))
-                sale_price = prices[0]
-                if len(prices) > 1:
-                    list_price = prices[-1]
-
-            # Calcular desconto
-            discount_percentage = None
-
-            # Tentar pegar desconto do badge "30% off"
-            discount_badge = product_element.select_one('div[data-component="dui-badge"] span.a-size-mini')
-            if discount_badge:
-                discount_text = discount_badge.get_text(strip=True)
-                discount_match = re.search(r'(\d+)%', discount_text)
-                if discount_match:
-                    discount_percentage = int(discount_match.group(1))
-
-            # Se não achou badge, calcular pelo preço
-            if not discount_percentage and list_price and sale_price and list_price > sale_price:
-                discount_percentage = int(((list_price - sale_price) / list_price) * 100)
-
-            # Prime
-            prime_elem = product_element.select_one(self.selectors['prime_badge'])
-            prime_eligible = prime_elem is not None
-
-            # Cupom
-            has_coupon = False
-            coupon_elem = product_element.select_one(self.selectors['coupon_badge'])
-            if coupon_elem:
-                has_coupon = True
-
-            # Texto promocional (ex: "Oferta Black Friday")
-            promotion_text = None
-            promo_elem = product_element.select_one('div[data-component="dui-badge"] .style_badgeMessage__xR2lh span')
-            if promo_elem:
-                promotion_text = promo_elem.get_text(strip=True)
+        cdp_url = os.getenv('BROWSER_CDP_URL')
+        if cdp_url:
+            try:
+                browser = await p.chromium.connect_over_cdp(cdp_url)
+                logger.info(f"♻️ Conectado ao navegador em {cdp_url}")
+                return browser
+            except PlaywrightError as e:
+                logger.warning(f"⚠️ Navegador em {cdp_url} indisponível, iniciando um local: {e}")
+
+        # Headless por padrão para não atrapalhar o usuário
+        return await p.chromium.launch(
+            headless=os.getenv('HEADLESS', 'True').lower() == 'true',
+            args=CHROMIUM_ARGS
+        )
 
-            return {
-                'product_name': product_name,
-                'original_url': original_url,
-                'image_url': image_url,
-                'asin': asin,
-                'list_price': list_price,
-                'sale_price': sale_price,
-                'discount_percentage': discount_percentage,
-                'has_coupon': has_coupon,
-                'prime_eligible': prime_eligible,
-                'rating': None,  # Não disponível nos cards Black Friday
-                'review_count': None,
-                'promotion_text': promotion_text
-            }
+    def _create_http_client(self):
+        """Cliente HTTP/2 compartilhado na execução, com os cookies da sessão salva"""
+        cookies = httpx.Cookies()
+        for cookie in self._session_cookies() or []:
+            cookies.set(cookie['name'], cookie['value'],
+                        domain=cookie['domain'], path=cookie.get('path', '/'))
+
+        return httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            cookies=cookies,
+            headers={'User-Agent': USER_AGENT, 'Accept-Language': 'pt-BR,pt;q=0.9'},
+            follow_redirects=True,
+            timeout=self.timeouts['page_load'] / 1000
+        )
 
-        except Exception as e:
-            logger.warning(f"⚠️ Erro ao extrair produto: {e}")
-            return None
+    async def _wait_for_cards_change(self, page, selector, previous_key, timeout):
+        """
+        Espera o grid renderizar cards diferentes de previous_key (CARDS_KEY_JS)
 
-    def _extract_asin(self, url):
-        """Extrai ASIN de uma URL da Amazon"""
-        patterns = [
-            r'/dp/([A-Z0-9]{10})',
-            r'/gp/product/([A-Z0-9]{10})',
-            r'ASIN=([A-Z0-9]{10})'
-        ]
-
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                return match.group(1)
-        return None
+        Substitui pausas fixas: retorna assim que o DOM muda.
 
-    def _parse_price(self, price_text):
-        """
-        Converte texto de preço para float
-        Exemplo: "R$ 1.234,56" -> 1234.56
+        Returns:
+            bool: True se mudou, False se estourou o timeout
         """
-        if not price_text:
-            return None
-
         try:
-            # Remover R$, espaços e converter vírgula para ponto
-            price_clean = price_text.replace('R$', '').replace(' ', '').strip()
-            price_clean = price_clean.replace('.', '').replace(',', '.')
-            return float(price_clean)
-        except:
-            return None
+            await page.wait_for_function(CARDS_CHANGED_JS, arg=[selector, previous_key], timeout=timeout)
+            return True
+        except PlaywrightTimeout:
+            return False
 
-    def scrape_listing_page(self, page, config):
+    async def _route_request(self, route):
+        """Aborta requests de recursos desnecessários para o scraping"""
+        request = route.request
+        if (request.resource_type in self.blocked_resource_types
+                or any(pattern in request.url for pattern in self.blocked_url_patterns)):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _route_product_request(self, route):
+        """Como _route_request, com os bloqueios extras das páginas de produto"""
+        request = route.request
+        if (request.resource_type in self.product_blocked_resource_types
+                or any(pattern in request.url for pattern in self.product_blocked_url_patterns)):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def scrape_listing_page(self, page, config):
         """
         Faz scraping de uma página de listagem de produtos
 
@@ -269,9 +484,10 @@ class AmazonScraper:
         # Detectar tipo de página e usar método apropriado
         page_type = config.get('type', 'deal')
         if page_type == 'bestseller':
-            return self._scrape_bestseller_page(page, config)
+            return await self._scrape_bestseller_page(page, config)
 
         max_products = config.get('max_offers', 50)
+        remaining = max_products
         collected_asins = set()  # Para evitar duplicatas
         products = []
 
@@ -282,60 +498,66 @@ class AmazonScraper:
         max_pages = (max_products // 25) + 5  # ~25 produtos por página
         empty_pages = 0  # Contador de páginas consecutivas sem produtos novos
 
+        # Templates de URL paginada montados uma vez por URL configurada
+        base_url = config['url'].partition('?')[0]  # Remove query params existentes
+        url_template_60 = base_url + '?promotionsSearchStartIndex={}&promotionsSearchPageSize=60'
+        url_template_90 = base_url + '?promotionsSearchStartIndex={}&promotionsSearchPageSize=90'
+
         try:
             for page_num in range(max_pages):
                 # PageSize muda de 60 para 90 após startIndex > 330
-                page_size = 90 if start_index > 330 else 60
+                if start_index > 330:
+                    page_size, url_template = 90, url_template_90
+                else:
+                    page_size, url_template = 60, url_template_60
 
                 # Construir URL com parâmetros de paginação
-                base_url = config['url'].split('?')[0]  # Remove query params existentes
-                if start_index == 0:
-                    paginated_url = base_url
-                else:
-                    paginated_url = f"{base_url}?promotionsSearchStartIndex={start_index}&promotionsSearchPageSize={page_size}"
+                paginated_url = url_template.format(start_index) if start_index else base_url
 
                 logger.info(f"   📄 Página {page_num + 1}: startIndex={start_index}, pageSize={page_size}")
 
-                # Navegar para URL paginada (usar domcontentloaded é mais rápido)
+                # Navegar para URL paginada: retorna assim que a resposta chega
+                # ('commit'); o wait_for_selector do grid abaixo espera o DOM
                 try:
-                    page.goto(paginated_url, wait_until='domcontentloaded', timeout=self.timeouts['page_load'])
+                    await page.goto(paginated_url, wait_until='commit', timeout=self.timeouts['page_load'])
                 except PlaywrightTimeout:
                     logger.warning(f"   ⚠️ Timeout na página {page_num + 1}, tentando continuar...")
                     if page_num == 0:
                         raise  # Se falhar na primeira página, é erro real
                     break  # Em outras páginas, parar graciosamente
 
-                # Aguardar carregamento extra para JavaScript
-                time.sleep(3)
-
                 # Aguardar grid de produtos aparecer
                 try:
-                    page.wait_for_selector('div[data-testid="virtuoso-item-list"]', timeout=10000)
-                except:
+                    await page.wait_for_selector('div[data-testid="virtuoso-item-list"]', timeout=10000)
+                except PlaywrightTimeout:
                     if page_num == 0:
                         logger.warning("⚠️ Grid virtualizado não encontrado na primeira página")
                     else:
                         logger.info("📊 Não há mais páginas de produtos")
                     break
 
+                # Aguardar o JavaScript popular o grid com cards (em vez de pausa fixa)
+                try:
+                    await page.wait_for_selector(DEAL_CARD_SELECTOR, timeout=self.timeouts['element_wait'])
+                except PlaywrightTimeout:
+                    logger.debug("   ⚠️ Grid sem cards após o timeout")
+
                 # Debug: contar quantos cards existem na página
-                all_cards = page.query_selector_all('div[data-testid="product-card"]')
-                logger.debug(f"   🔍 Cards encontrados na página: {len(all_cards)}")
+                card_count = await page.locator(DEAL_CARD_SELECTOR).count()
+                logger.debug("   🔍 Cards encontrados na página: %d", card_count)
 
                 # Fazer scroll na página para carregar todos os produtos visíveis
-                products_before = len(products)
-                products_in_page = self._collect_products_from_page(page, collected_asins, config)
-
-                for product in products_in_page:
-                    if len(products) >= max_products:
-                        break
-                    products.append(product)
+                products_in_page = await self._collect_products_from_page(page, collected_asins, config)
 
-                new_count = len(products) - products_before
-                logger.info(f"   📦 Coletados +{new_count} produtos (cards na página: {len(all_cards)}) → Total: {len(products)}")
+                # Só o que ainda cabe no limite (contagem regressiva)
+                new_products = products_in_page[:remaining]
+                products.extend(new_products)
+                new_count = len(new_products)
+                remaining -= new_count
+                logger.info("   📦 Coletados +%d produtos (cards na página: %d) → Total: %d", new_count, card_count, len(products))
 
                 # Verificar se já temos produtos suficientes
-                if len(products) >= max_products:
+                if not remaining:
                     logger.info(f"✅ Atingido limite de {max_products} produtos")
                     break
 
@@ -354,7 +576,7 @@ class AmazonScraper:
 
             if not products:
                 # Salvar HTML para debug
-                html = page.content()
+                html = await page.content()
                 debug_path = Path('debug_page.html')
                 with open(debug_path, 'w', encoding='utf-8') as f:
                     f.write(html)
@@ -366,7 +588,7 @@ class AmazonScraper:
 
             # Log dos produtos coletados
             for idx, product_data in enumerate(products[:max_products], 1):
-                logger.info(f"  ✅ [{idx}/{len(products)}] {product_data['product_name'][:60]}...")
+                logger.info("  ✅ [%d/%d] %.60s...", idx, len(products), product_data['product_name'])
 
             logger.info(f"📊 Total extraído: {len(products)} produtos")
             return products[:max_products]  # Limitar ao máximo configurado
@@ -380,10 +602,13 @@ class AmazonScraper:
             traceback.print_exc()
             return []
 
-    def _scrape_bestseller_page(self, page, config):
+    async def _scrape_bestseller_page(self, page, config):
         """
         Faz scraping de páginas Best Sellers da Amazon
 
+        Cada página é buscada primeiro via HTTP (_fetch_bestseller_cards) e só
+        renderizada no Playwright se o HTML não trouxer os cards.
+
         Best Sellers usam estrutura diferente:
         - Cards: div.zg-grid-general-faceout
         - ASIN: div[data-asin]
@@ -399,64 +624,43 @@ class AmazonScraper:
             list: Lista de produtos encontrados
         """
         max_products = config.get('max_offers', 50)
+        remaining = max_products
         collected_asins = set()
         products = []
 
         # Best Sellers tem normalmente 2 páginas de 50 produtos cada
-        max_pages = (max_products // 50) + 1
+        max_pages = (max_products // BESTSELLER_PAGE_SIZE) + 1
+
+        # Template de URL paginada montado uma vez por URL configurada
+        base_url = config['url'].partition('?')[0]
+        url_template = base_url + '?pg={}'
 
         try:
             for page_num in range(1, max_pages + 1):
                 # Construir URL paginada
-                base_url = config['url'].split('?')[0]
-                paginated_url = f"{base_url}?pg={page_num}" if page_num > 1 else base_url
+                paginated_url = url_template.format(page_num) if page_num > 1 else base_url
 
                 logger.info(f"   📄 Best Sellers página {page_num}: {paginated_url}")
 
-                # Navegar
-                try:
-                    page.goto(paginated_url, wait_until='domcontentloaded', timeout=self.timeouts['page_load'])
-                except PlaywrightTimeout:
-                    logger.warning(f"   ⚠️ Timeout na página {page_num}")
-                    if page_num == 1:
-                        raise
-                    break
-
-                # Aguardar carregamento
-                time.sleep(2)
-
-                # Verificar se há produtos (seletor de Best Sellers)
-                try:
-                    page.wait_for_selector('div.zg-grid-general-faceout, div[id^="gridItemRoot"]', timeout=10000)
-                except:
-                    if page_num == 1:
-                        logger.warning("⚠️ Grid de Best Sellers não encontrado")
-                        # Salvar HTML para debug
-                        html = page.content()
-                        debug_path = Path('debug_page.html')
-                        with open(debug_path, 'w', encoding='utf-8') as f:
-                            f.write(html)
-                        logger.info(f"   HTML salvo em {debug_path} para debug")
-                    break
-
-                # Fazer scroll para carregar todos os produtos
-                for _ in range(5):
-                    page.evaluate('window.scrollBy(0, window.innerHeight)')
-                    time.sleep(0.3)
+                # HTML do servidor via HTTP (sem renderizar); Playwright só
+                # se a resposta não trouxer todos os cards que ainda faltam
+                cards = await self._fetch_bestseller_cards(paginated_url, min(BESTSELLER_PAGE_SIZE, remaining))
+                if cards is None:
+                    cards = await self._render_bestseller_cards(page, paginated_url, page_num)
+                    if cards is None:
+                        break
 
                 # Coletar produtos desta página
-                products_before = len(products)
-                page_products = self._collect_bestseller_products(page, collected_asins, config)
-
-                for product in page_products:
-                    if len(products) >= max_products:
-                        break
-                    products.append(product)
+                page_products = self._collect_bestseller_products(cards, collected_asins, config)
 
-                new_count = len(products) - products_before
-                logger.info(f"   📦 Coletados +{new_count} produtos → Total: {len(products)}")
+                # Só o que ainda cabe no limite (contagem regressiva)
+                new_products = page_products[:remaining]
+                products.extend(new_products)
+                new_count = len(new_products)
+                remaining -= new_count
+                logger.info("   📦 Coletados +%d produtos → Total: %d", new_count, len(products))
 
-                if len(products) >= max_products:
+                if not remaining:
                     logger.info(f"✅ Atingido limite de {max_products} produtos")
                     break
 
@@ -467,7 +671,7 @@ class AmazonScraper:
             if products:
                 logger.info(f"🔍 Total Best Sellers: {len(products)} produtos")
                 for idx, p in enumerate(products[:10], 1):
-                    logger.info(f"  ✅ [{idx}] {p['product_name'][:60]}...")
+                    logger.info("  ✅ [%d] %.60s...", idx, p['product_name'])
                 if len(products) > 10:
                     logger.info(f"  ... e mais {len(products) - 10} produtos")
 
@@ -479,12 +683,97 @@ class AmazonScraper:
             traceback.print_exc()
             return []
 
-    def _collect_bestseller_products(self, page, collected_asins, config):
+    async def _fetch_bestseller_cards(self, url, expected):
         """
-        Coleta produtos de uma página Best Sellers
+        Baixa uma página Best Sellers via HTTP e extrai os cards com lxml
+
+        Best Sellers vêm renderizados do servidor: o cliente HTTP compartilhado
+        (HTTP/2, conexões reaproveitadas) evita renderizar a página no navegador.
+
+        Args:
+            url: URL paginada
+            expected: Cards necessários desta página (min(BESTSELLER_PAGE_SIZE, restante))
+
+        Returns:
+            list: Cards no formato de BESTSELLER_CARDS_JS, ou None para usar o Playwright
+        """
+        if self.http_client is None:
+            return None
+
+        try:
+            response = await self.http_client.get(url)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.debug("   ⚠️ HTTP falhou para %s: %s", url, e)
+            return None
+
+        # Corpo vazio (ou só espaços) com 200: lxml levanta ParserError
+        try:
+            tree = lxml.html.fromstring(response.content)
+        except etree.ParserError as e:
+            logger.debug("   ⚠️ HTML vazio/inválido em %s: %s", url, e)
+            return None
+        cards = [_bestseller_card_from_element(el) for el in _XP_BESTSELLER_CARDS(tree)]
+
+        # Captcha, página vazia ou só a parte renderizada no servidor:
+        # renderizar no navegador (com scroll) para não perder itens
+        if len(cards) < expected:
+            logger.debug("   ⚠️ HTTP trouxe %d de %d cards, usando Playwright", len(cards), expected)
+            return None
+
+        return cards
+
+    async def _render_bestseller_cards(self, page, url, page_num):
+        """
+        Renderiza uma página Best Sellers no Playwright e lê os cards
 
         Args:
             page: Página Playwright
+            url: URL paginada
+            page_num: Número da página (1 = primeira)
+
+        Returns:
+            list: Cards de BESTSELLER_CARDS_JS, ou None se não há mais páginas
+        """
+        # Navegar ('commit': o wait_for_selector do grid abaixo espera o DOM)
+        try:
+            await page.goto(url, wait_until='commit', timeout=self.timeouts['page_load'])
+        except PlaywrightTimeout:
+            logger.warning(f"   ⚠️ Timeout na página {page_num}")
+            if page_num == 1:
+                raise
+            return None
+
+        # Verificar se há produtos (seletor de Best Sellers)
+        try:
+            await page.wait_for_selector('div.zg-grid-general-faceout, div[id^="gridItemRoot"]', timeout=10000)
+        except PlaywrightTimeout:
+            if page_num == 1:
+                logger.warning("⚠️ Grid de Best Sellers não encontrado")
+                # Salvar HTML para debug
+                html = await page.content()
+                debug_path = Path('debug_page.html')
+                with open(debug_path, 'w', encoding='utf-8') as f:
+                    f.write(html)
+                logger.info(f"   HTML salvo em {debug_path} para debug")
+            return None
+
+        # Fazer scroll para carregar todos os produtos; cada passo
+        # espera no máximo o que antes era uma pausa fixa de 0,3s
+        for _ in range(5):
+            cards_key = await page.evaluate(CARDS_KEY_JS, BESTSELLER_CARD_SELECTOR)
+            await page.evaluate('window.scrollBy(0, window.innerHeight)')
+            await self._wait_for_cards_change(page, BESTSELLER_CARD_SELECTOR, cards_key, 300)
+
+        # Os cards têm data-asin e estão dentro de div.zg-grid-general-faceout
+        return await page.evaluate(BESTSELLER_CARDS_JS)
+
+    def _collect_bestseller_products(self, cards, collected_asins, config):
+        """
+        Coleta produtos de uma página Best Sellers
+
+        Args:
+            cards: Cards brutos (BESTSELLER_CARDS_JS ou _bestseller_card_from_element)
             collected_asins: Set de ASINs já coletados
             config: Configuração da URL
 
@@ -493,38 +782,41 @@ class AmazonScraper:
         """
         products = []
 
-        # Encontrar todos os cards de produto
-        # Os cards têm data-asin e estão dentro de div.zg-grid-general-faceout
-        cards = page.query_selector_all('div[data-asin]')
+        logger.debug("   🔍 Cards com data-asin encontrados: %d", len(cards))
 
-        logger.debug(f"   🔍 Cards com data-asin encontrados: {len(cards)}")
+        # Ligações locais para o loop por card
+        source_url = config['url']
+        category = config.get('category')
+        from_card = self._bestseller_from_card
+        add_asin = collected_asins.add
+        append = products.append
 
         for card in cards:
             try:
-                asin = card.get_attribute('data-asin')
+                asin = card['asin']
                 if not asin or len(asin) != 10:
                     continue
 
                 if asin in collected_asins:
                     continue
 
-                product_data = self._extract_bestseller_product(card)
+                product_data = from_card(card)
 
                 if product_data and product_data.get('asin'):
-                    collected_asins.add(product_data['asin'])
-                    product_data['source_url'] = config['url']
+                    add_asin(product_data['asin'])
+                    product_data['source_url'] = source_url
                     product_data['scrape_type'] = 'bestseller'
-                    product_data['category'] = config.get('category')
-                    products.append(product_data)
+                    product_data['category'] = category
+                    append(product_data)
 
-            except Exception as e:
-                logger.debug(f"Erro ao extrair card bestseller: {e}")
+            except CARD_ERRORS as e:
+                logger.debug("Erro ao extrair card bestseller: %s", e)
 
         return products
 
-    def _extract_bestseller_product(self, card):
+    def _bestseller_from_card(self, card):
         """
-        Extrai informações de um card de Best Sellers
+        Monta os dados de um card de Best Sellers lido por BESTSELLER_CARDS_JS
 
         Estrutura Best Sellers:
         - ASIN: div[data-asin]
@@ -536,91 +828,65 @@ class AmazonScraper:
         - Ranking: span.zg-bdg-text (ex: "#1", "#15")
 
         Args:
-            card: ElementHandle do Playwright
+            card: dict com os campos brutos do card
 
         Returns:
             dict: Dados do produto ou None
         """
         try:
-            asin = card.get_attribute('data-asin')
+            asin = card['asin']
 
             # Link do produto
-            link_elem = card.query_selector('a[href*="/dp/"]')
-            if not link_elem:
-                return None
-
-            original_url = link_elem.get_attribute('href')
+            original_url = card['href']
             if not original_url:
                 return None
             if not original_url.startswith('http'):
                 original_url = 'https://www.amazon.com.br' + original_url
 
-            # Nome do produto - tentar múltiplos seletores
+            # Nome do produto - seletores de título Best Sellers (classes
+            # dinâmicas com _cDEzb_), na ordem de preferência
             product_name = None
-
-            # Seletores de título Best Sellers (classes dinâmicas com _cDEzb_)
-            title_selectors = [
-                'div[class*="p13n-sc-css-line-clamp"]',
-                'span[class*="p13n-sc-css-line-clamp"]',
-            ]
-
-            for selector in title_selectors:
-                title_elem = card.query_selector(selector)
-                if title_elem:
-                    text = title_elem.inner_text()
-                    if text and len(text) > 5:
-                        product_name = text
-                        break
+            for text in card['titles']:
+                if text and len(text) > 5:
+                    product_name = text
+                    break
 
             # Fallback: alt da imagem
             if not product_name:
-                img_elem = card.query_selector('img[alt]')
-                if img_elem:
-                    product_name = img_elem.get_attribute('alt')
+                product_name = card['alt']
 
             if not product_name:
                 return None
 
             # Imagem
-            image_url = None
-            img_elem = card.query_selector('img.p13n-product-image, img.p13n-sc-dynamic-image')
-            if img_elem:
-                image_url = img_elem.get_attribute('src')
+            image_url = card['src']
 
             # Preço - seletor específico de Best Sellers
             sale_price = None
-            price_elem = card.query_selector('span[class*="p13n-sc-price"]')
-            if price_elem:
-                price_text = price_elem.inner_text()
-                sale_price = self._parse_price(price_text)
+            if card['price'] is not None:
+                sale_price = parse_price(card['price'])
 
             # Rating
             rating = None
-            rating_elem = card.query_selector('i[class*="a-icon-star"] span.a-icon-alt')
-            if rating_elem:
-                rating_text = rating_elem.inner_text()
+            if card['rating']:
                 # "4,8 de 5 estrelas"
-                match = re.search(r'([\d,]+)\s+de\s+5', rating_text)
+                match = _RATING_RE.search(card['rating'])
                 if match:
                     rating = float(match.group(1).replace(',', '.'))
 
             # Review count
             review_count = None
-            review_elem = card.query_selector('a[href*="/product-reviews/"] span.a-size-small')
-            if review_elem:
-                review_text = review_elem.inner_text()
+            if card['reviews']:
                 # Remover pontos e vírgulas, pegar só números
-                review_text = re.sub(r'[^\d]', '', review_text)
+                review_text = _NON_DIGITS_RE.sub('', card['reviews'])
                 if review_text:
                     review_count = int(review_text)
 
             # Ranking (posição no best sellers)
             ranking = None
-            rank_elem = card.query_selector('span.zg-bdg-text')
-            if rank_elem:
-                rank_text = rank_elem.inner_text()
+            if card['rank']:
                 # "#15" -> 15
-                rank_match = re.search(r'#?(\d+)', rank_text)
+                rank_match = _RANK_RE.search(card['rank'])
                 if rank_match:
                     ranking = int(rank_match.group(1))
 
@@ -639,14 +905,18 @@ class AmazonScraper:
                 'promotion_text': f"Best Seller #{ranking}" if ranking else "Best Seller"
             }
 
-        except Exception as e:
-            logger.debug(f"Erro extraindo bestseller: {e}")
+        except CARD_ERRORS as e:
+            logger.debug("Erro extraindo bestseller: %s", e)
             return None
 
-    def _collect_products_from_page(self, page, collected_asins, config):
+    async def _collect_products_from_page(self, page, collected_asins, config):
         """
         Coleta todos os produtos de uma página fazendo scroll
 
+        A cada scroll, os cards visíveis são lidos em um único page.evaluate
+        (DEAL_CARDS_JS), que já descarta os ASINs coletados; só o parse roda
+        em Python.
+
         Args:
             page: Página Playwright
             collected_asins: Set de ASINs já coletados
@@ -659,32 +929,35 @@ class AmazonScraper:
         no_new_count = 0
         duplicates_count = 0
 
+        # Ligações locais para o loop por card
+        source_url = config['url']
+        scrape_type = config.get('type', 'product')
+        category = config.get('category')  # Categoria do config
+        from_card = self._product_from_card
+        add_asin = collected_asins.add
+        append = products.append
+
         # Fazer scroll progressivo na página para carregar todos os produtos
         for scroll_num in range(15):  # Máximo de scrolls por página
-            current_cards = page.query_selector_all('div[data-testid="product-card"]')
+            # Só cards com ASIN ainda não coletado voltam do navegador
+            scan = await page.evaluate(DEAL_CARDS_JS, list(collected_asins))
+            duplicates_count += scan['duplicates']
 
             new_in_scroll = 0
-            for card in current_cards:
+            for card in scan['cards']:
                 try:
-                    asin = card.get_attribute('data-asin')
-                    if not asin:
-                        continue
-                    if asin in collected_asins:
-                        duplicates_count += 1
-                        continue
-
-                    product_data = self._extract_product_from_element(card)
+                    product_data = from_card(card)
 
                     if product_data and product_data.get('asin'):
-                        collected_asins.add(product_data['asin'])
-                        product_data['source_url'] = config['url']
-                        product_data['scrape_type'] = config.get('type', 'product')
-                        product_data['category'] = config.get('category')  # Categoria do config
-                        products.append(product_data)
+                        add_asin(product_data['asin'])
+                        product_data['source_url'] = source_url
+                        product_data['scrape_type'] = scrape_type
+                        product_data['category'] = category
+                        append(product_data)
                         new_in_scroll += 1
 
-                except Exception as e:
-                    logger.debug(f"Erro ao extrair card: {e}")
+                except CARD_ERRORS as e:
+                    logger.debug("Erro ao extrair card: %s", e)
 
             if new_in_scroll > 0:
                 no_new_count = 0
@@ -693,38 +966,33 @@ class AmazonScraper:
 
             # Se não encontrou produtos novos em 3 scrolls, parar
             if no_new_count >= 3:
-                logger.debug(f"   🔄 Scroll {scroll_num+1}: {len(current_cards)} cards, {duplicates_count} duplicados")
+                logger.debug("   🔄 Scroll %d: %d cards, %d duplicados", scroll_num + 1, scan['total'], duplicates_count)
                 break
 
-            # Scroll para baixo
-            page.evaluate('window.scrollBy(0, window.innerHeight * 1.2)')
-            time.sleep(0.5)
+            # Scroll para baixo e esperar o grid renderizar cards novos;
+            # se nada mudar, chegamos ao fim desta página
+            await page.evaluate('window.scrollBy(0, window.innerHeight * 1.2)')
+            if not await self._wait_for_cards_change(page, DEAL_CARD_SELECTOR, scan['key'], 2000):
+                break
 
         return products
 
-    def _extract_product_from_element(self, card):
+    def _product_from_card(self, card):
         """
-        Extrai informações de um card de produto usando Playwright Element
+        Monta os dados de um card de oferta lido por DEAL_CARDS_JS
 
         Args:
-            card: ElementHandle do Playwright
+            card: dict com os campos brutos do card
 
         Returns:
             dict: Dados do produto ou None
         """
         try:
             # ASIN do atributo data-asin
-            asin = card.get_attribute('data-asin')
+            asin = card['asin']
 
             # Link do produto
-            link_elem = card.query_selector('a[href*="/dp/"]')
-            if not link_elem:
-                link_elem = card.query_selector('a[data-testid="product-card-link"]')
-
-            if not link_elem:
-                return None
-
-            original_url = link_elem.get_attribute('href')
+            original_url = card['href']
             if not original_url:
                 return None
             if not original_url.startswith('http'):
@@ -732,60 +1000,38 @@ class AmazonScraper:
 
             # Se não pegou ASIN do atributo, extrair da URL
             if not asin:
-                asin = self._extract_asin(original_url)
-
-            # Nome do produto - tentar vários seletores
-            product_name = None
+                asin = _extract_asin(original_url)
 
-            # Tentar pelo alt da imagem (mais confiável)
-            img_elem = card.query_selector('img[alt]')
-            if img_elem:
-                product_name = img_elem.get_attribute('alt')
-
-            # Fallback: título
-            if not product_name:
-                title_elem = card.query_selector('span.a-truncate-full')
-                if title_elem:
-                    product_name = title_elem.inner_text()
-
-            if not product_name:
-                title_elem = card.query_selector('p[id^="title-"]')
-                if title_elem:
-                    product_name = title_elem.inner_text()
+            # Nome do produto: alt da imagem (mais confiável), depois títulos
+            product_name = card['alt'] or card['title_full'] or card['title_p']
 
             if not product_name:
                 return None
 
             # Imagem
-            image_url = None
-            if img_elem:
-                image_url = img_elem.get_attribute('src')
+            image_url = card['src']
 
-            # Preços - pegar todos os offscreen
+            # Preços - todos os offscreen
             prices = []
-            price_spans = card.query_selector_all('span.a-offscreen')
-            for span in price_spans:
-                price_text = span.inner_text()
+            for price_text in card['prices']:
                 if 'R$' in price_text:
-                    parsed = self._parse_price(price_text)
+                    parsed = parse_price(price_text)
                     if parsed:
                         prices.append(parsed)
 
-            # Ordenar preços
+            # Menor é sale_price, maior é list_price (se diferente)
             sale_price = None
             list_price = None
             if prices:
-                prices = sorted(set(prices))
-                sale_price = prices[0]
-                if len(prices) > 1:
-                    list_price = prices[-1]
+                sale_price = min(prices)
+                highest = max(prices)
+                if highest != sale_price:
+                    list_price = highest
 
             # Desconto do badge
             discount_percentage = None
-            discount_badge = card.query_selector('div[data-component="dui-badge"] span.a-size-mini')
-            if discount_badge:
-                discount_text = discount_badge.inner_text()
-                discount_match = re.search(r'(\d+)%', discount_text)
+            if card['discount']:
+                discount_match = _DISCOUNT_RE.search(card['discount'])
                 if discount_match:
                     discount_percentage = int(discount_match.group(1))
 
@@ -793,12 +1039,6 @@ class AmazonScraper:
             if not discount_percentage and list_price and sale_price and list_price > sale_price:
                 discount_percentage = int(((list_price - sale_price) / list_price) * 100)
 
-            # Texto promocional
-            promotion_text = None
-            promo_elem = card.query_selector('.style_badgeMessage__xR2lh span')
-            if promo_elem:
-                promotion_text = promo_elem.inner_text()
-
             return {
                 'product_name': product_name,
                 'original_url': original_url,
@@ -811,23 +1051,23 @@ class AmazonScraper:
                 'prime_eligible': False,
                 'rating': None,
                 'review_count': None,
-                'promotion_text': promotion_text
+                'promotion_text': card['promo']
             }
 
-        except Exception as e:
-            logger.debug(f"Erro extraindo produto: {e}")
+        except CARD_ERRORS as e:
+            logger.debug("Erro extraindo produto: %s", e)
             return None
 
-    def _scroll_page(self, page):
+    async def _scroll_page(self, page):
         """Scroll suave na página para carregar lazy loading"""
         max_scrolls = self.config['scraping_settings']['navigation']['max_scroll_attempts']
         scroll_delay = self.config['scraping_settings']['navigation']['scroll_delay']
 
         for i in range(max_scrolls):
-            page.evaluate('window.scrollBy(0, window.innerHeight)')
-            time.sleep(scroll_delay / 1000)
+            await page.evaluate('window.scrollBy(0, window.innerHeight)')
+            await asyncio.sleep(scroll_delay / 1000)
 
-    def generate_affiliate_link(self, page, product_data):
+    async def generate_affiliate_link(self, page, product_data):
         """
         Navega para o produto, captura dados detalhados e gera link de afiliado via SiteStripe.
 
@@ -845,230 +1085,440 @@ class AmazonScraper:
         Returns:
             str: Link de afiliado ou None se falhar
         """
-        logger.info(f"🔗 Gerando link de afiliado para: {product_data['product_name'][:50]}...")
+        logger.debug("🔗 Gerando link de afiliado para: %.50s...", product_data['product_name'])
 
         try:
-            # Navegar para página do produto
-            page.goto(product_data['original_url'], wait_until='domcontentloaded', timeout=self.timeouts['page_load'])
-
-            # Aguardar página carregar
-            time.sleep(self.delays['sitestripe_load'])
-
-            # ========================================
-            # CAPTURAR DADOS DETALHADOS DA PÁGINA
-            # ========================================
+            # Navegar para página do produto; 'commit' não espera o parse do DOM
+            # inteiro, a espera real é pelo bloco de preço logo abaixo
+            await page.goto(product_data['original_url'], wait_until='commit', timeout=self._t_page_load)
 
-            # 1. PREÇO PROMOCIONAL (sale_price) - priceToPay
+            # Aguardar o bloco de preço existir no DOM (em vez de um delay fixo);
+            # sem preço na página, segue assim mesmo com os campos que houver
             try:
-                # Método 1: Pegar via whole + fraction (mais confiável)
-                whole_elem = page.query_selector('span.priceToPay span.a-price-whole')
-                fraction_elem = page.query_selector('span.priceToPay span.a-price-fraction')
-
-                if whole_elem and fraction_elem:
-                    whole_text = whole_elem.inner_text().replace(',', '').replace('.', '').replace('\n', '').strip()
-                    fraction_text = fraction_elem.inner_text().replace('\n', '').strip()
-                    logger.info(f"  💰 Preço whole={whole_text}, fraction={fraction_text}")
-                    if whole_text and fraction_text:
-                        new_sale_price = float(f"{whole_text}.{fraction_text}")
-                        product_data['sale_price'] = new_sale_price
-                        logger.info(f"  💰 Preço promocional capturado: R${new_sale_price}")
-                else:
-                    # Método 2: Fallback para offscreen
-                    logger.debug(f"  ⚠️ Seletores whole/fraction não encontrados")
-                    price_elem = page.query_selector('#corePrice_feature_div span.a-offscreen, #corePriceDisplay_desktop_feature_div span.a-offscreen')
-                    if price_elem:
-                        price_text = price_elem.inner_text()
-                        new_sale_price = self._parse_price(price_text)
-                        if new_sale_price:
-                            product_data['sale_price'] = new_sale_price
-                            logger.info(f"  💰 Preço promocional (fallback): R${new_sale_price}")
-            except Exception as e:
-                logger.warning(f"  ⚠️ Erro ao capturar preço promocional: {e}")
-
-            # 2. PREÇO ORIGINAL (list_price) - preço riscado "De:"
-            try:
-                # Seletor baseado no HTML: span.a-price.a-text-price com data-a-strike="true"
-                list_price_elem = page.query_selector('span.a-price.a-text-price[data-a-strike="true"] span.a-offscreen')
-                if not list_price_elem:
-                    # Fallback: basisPrice
-                    list_price_elem = page.query_selector('.basisPrice span.a-offscreen')
-
-                if list_price_elem:
-                    list_price_text = list_price_elem.inner_text()
-                    new_list_price = self._parse_price(list_price_text)
-                    if new_list_price:
-                        product_data['list_price'] = new_list_price
-                        logger.info(f"  💵 Preço original capturado: R${new_list_price}")
-            except Exception as e:
-                logger.warning(f"  ⚠️ Erro ao capturar preço original: {e}")            # 3. PARCELAMENTO (installment_info)
-            try:
-                installment_elem = page.query_selector('#best-offer-string-cc')
-                if installment_elem:
-                    installment_text = installment_elem.inner_text().strip()
-                    if installment_text:
-                        product_data['installment_info'] = installment_text
-                        logger.debug(f"  💳 Parcelamento: {installment_text[:50]}...")
-            except Exception as e:
-                logger.debug(f"  ⚠️ Erro ao capturar parcelamento: {e}")
+                await page.wait_for_selector(PRICE_BLOCK_SELECTOR, state='attached', timeout=self._t_price_wait)
+            except PlaywrightTimeout:
+                logger.debug("  ⚠️ Bloco de preço não encontrado, continuando")
 
-            # 4. FRETE (shipping_info)
+            # Frete e promoções ficam abaixo do bloco de preço: esperar o DOM
+            # terminar de ser parseado antes de ler os campos de uma vez
             try:
-                # Tentar pegar do atributo data-csa-c-delivery-price
-                shipping_elem = page.query_selector('span[data-csa-c-delivery-price]')
-                if shipping_elem:
-                    delivery_price = shipping_elem.get_attribute('data-csa-c-delivery-price')
-                    delivery_time = shipping_elem.get_attribute('data-csa-c-delivery-time') or ''
-
-                    if delivery_price:
-                        shipping_info = f"{delivery_price}"
-                        if delivery_time:
-                            shipping_info += f" - {delivery_time}"
-                        product_data['shipping_info'] = shipping_info
-                        logger.debug(f"  🚚 Frete: {shipping_info}")
-            except Exception as e:
-                logger.debug(f"  ⚠️ Erro ao capturar frete: {e}")
+                await page.wait_for_load_state('domcontentloaded', timeout=self._t_page_load)
+            except PlaywrightTimeout:
+                logger.debug("  ⚠️ DOM não terminou de carregar, extraindo campos parciais")
 
-            # 5. PROMOÇÕES/CUPONS (promotion_text) - múltiplas, separadas por |||
-            try:
-                promo_container = page.query_selector('span.promoPriceBlockMessage')
-                if promo_container:
-                    promotions = []
-
-                    # Buscar todas as divs de promoção dentro do container
-                    promo_divs = promo_container.query_selector_all('div[style*="padding"]')
-
-                    for promo_div in promo_divs:
-                        promo_text = ""
-
-                        # Tentar pegar o badge (ex: "R$300" ou "Oferta")
-                        badge = promo_div.query_selector('label[id^="greenBadge"]')
-                        if badge:
-                            badge_text = badge.inner_text().strip()
-                            promo_text = badge_text + " "
-
-                        # Pegar a mensagem da promoção
-                        msg_span = promo_div.query_selector('span[id^="promoMessage"]')
-                        if msg_span:
-                            # Pegar apenas o texto, não os links
-                            msg_text = msg_span.inner_text().strip()
-                            # Limpar texto (remover "Ver itens participantes", "Termos", etc.)
-                            msg_text = re.sub(r'\s*(Ver itens participantes|Termos)\s*', '', msg_text)
-                            msg_text = msg_text.strip()
-                            promo_text += msg_text
-
-                        if promo_text.strip():
-                            promotions.append(promo_text.strip())
-
-                    if promotions:
-                        # Juntar com ||| como separador
-                        product_data['promotion_text'] = '|||'.join(promotions)
-                        product_data['has_coupon'] = True
-                        logger.debug(f"  🎟️ Promoções: {len(promotions)} encontradas")
-                        for p in promotions:
-                            logger.debug(f"      - {p[:60]}...")
-            except Exception as e:
-                logger.debug(f"  ⚠️ Erro ao capturar promoções: {e}")
+            # ========================================
+            # CAPTURAR DADOS DETALHADOS DA PÁGINA
+            # ========================================
 
-            # Recalcular desconto com preços atualizados
-            if product_data.get('list_price') and product_data.get('sale_price'):
-                list_p = product_data['list_price']
-                sale_p = product_data['sale_price']
-                if list_p > sale_p:
-                    product_data['discount_percentage'] = int(((list_p - sale_p) / list_p) * 100)
+            # Todos os campos em um único round-trip; o parse roda em Python
+            details = await extract_product_details(page)
+            self._apply_product_details(product_data, details)
 
             # ========================================
             # GERAR LINK DE AFILIADO VIA SITESTRIPE
             # ========================================
 
+            # Link manual com o tag é equivalente e dispensa o SiteStripe
+            if self.prefer_manual_link:
+                manual_link = self._manual_affiliate_link(product_data)
+                if manual_link:
+                    return manual_link
+
             sitestripe_link = None
 
             try:
                 # Aguardar botão "Obter link" do SiteStripe aparecer
-                get_link_button = page.wait_for_selector('#amzn-ss-get-link-button', timeout=self.timeouts['sitestripe_wait'])
+                get_link_button = await page.wait_for_selector('#amzn-ss-get-link-button', timeout=self._t_sitestripe_wait)
 
                 if get_link_button:
                     logger.debug("  📍 Botão SiteStripe encontrado, clicando...")
 
-                    # Clicar no botão "Obter link"
-                    get_link_button.click()
-
-                    # Aguardar o modal/textarea aparecer
-                    time.sleep(1.5)
+                    # Clicar no botão "Obter link" via DOM (um round-trip, sem as
+                    # verificações de visibilidade/scroll do click do Playwright)
+                    await get_link_button.evaluate('button => button.click()')
 
-                    # Tentar pegar o link do textarea
-                    link_textarea = page.wait_for_selector('#amzn-ss-text-shortlink-textarea', timeout=5000)
+                    # Aguardar o textarea receber o link encurtado (amzn.to);
+                    # a função devolve o próprio link
+                    link_handle = await page.wait_for_function(SHORTLINK_READY_JS, timeout=self._t_sitestripe_wait)
+                    sitestripe_link = await link_handle.json_value()
 
-                    if link_textarea:
-                        sitestripe_link = link_textarea.input_value()
-
-                        # Verificar se é um link válido
-                        if sitestripe_link and 'amzn.to' in sitestripe_link:
-                            logger.info(f"  ✅ Link SiteStripe gerado: {sitestripe_link}")
-                            return sitestripe_link
-                        else:
-                            logger.warning(f"  ⚠️ Link inválido no textarea: {sitestripe_link}")
+                    logger.debug("  ✅ Link SiteStripe gerado: %s", sitestripe_link)
+                    return sitestripe_link
 
             except PlaywrightTimeout:
                 logger.debug("  ⚠️ SiteStripe não encontrado ou timeout")
 
             except Exception as e:
-                logger.debug(f"  ⚠️ Erro ao usar SiteStripe: {e}")
+                logger.debug("  ⚠️ Erro ao usar SiteStripe: %s", e)
 
             # Fallback: gerar link manualmente com tag de afiliado
-            asin = product_data.get('asin')
-            if asin:
-                associate_tag = os.getenv('AMAZON_ASSOCIATE_TAG', '')
-                if associate_tag:
-                    sitestripe_link = f"https://www.amazon.com.br/dp/{asin}/?tag={associate_tag}"
-                    logger.info(f"  ✅ Link manual gerado com tag: {associate_tag}")
-                    return sitestripe_link
+            manual_link = self._manual_affiliate_link(product_data)
+            if manual_link:
+                return manual_link
 
-            logger.warning(f"  ❌ Não foi possível gerar link de afiliado")
+            logger.warning("  ❌ Não foi possível gerar link de afiliado")
             return None
 
         except Exception as e:
-            logger.error(f"❌ Erro ao gerar link de afiliado: {e}")
+            logger.error("❌ Erro ao gerar link de afiliado: %s", e)
             return None
 
-    def process_product(self, page, product_data):
+    def _manual_affiliate_link(self, product_data):
+        """
+        Monta o link de afiliado com o ASIN e o AMAZON_ASSOCIATE_TAG
+
+        Returns:
+            str: Link de afiliado ou None sem ASIN/tag
         """
-        Processa um produto: gera link de afiliado e salva no banco
+        asin = product_data.get('asin')
+        if asin and self._associate_tag:
+            logger.debug("  ✅ Link manual gerado com tag: %s", self._associate_tag)
+            return f"https://www.amazon.com.br/dp/{asin}/?tag={self._associate_tag}"
+        return None
+
+    def _apply_product_details(self, product_data, details):
+        """
+        Atualiza product_data com os campos lidos da página do produto por extract_product_details
+
+        - Preço promocional (sale_price): whole + fraction de priceToPay, ou offscreen
+        - Preço original (list_price): preço riscado "De:" ou basisPrice
+        - Parcelamento (installment_info), frete (shipping_info)
+        - Promoções (promotion_text): múltiplas, separadas por |||
+
+        Args:
+            product_data: Dados do produto (atualizado no lugar)
+            details: dict retornado por extract_product_details
+        """
+        # 1. PREÇO PROMOCIONAL (sale_price) - priceToPay
+        whole = details['whole']
+        fraction = details['fraction']
+        if whole is not None and fraction is not None:
+            # Método 1: whole + fraction (mais confiável)
+            new_sale_price = parse_price_from_parts(whole, fraction)
+            if new_sale_price is not None:
+                product_data['sale_price'] = new_sale_price
+                logger.debug("  💰 Preço promocional capturado: R$%s", new_sale_price)
+            else:
+                logger.warning("  ⚠️ Erro ao capturar preço promocional: whole=%r, fraction=%r", whole, fraction)
+        else:
+            # Método 2: Fallback para offscreen
+            logger.debug("  ⚠️ Seletores whole/fraction não encontrados")
+            if details['offscreen'] is not None:
+                new_sale_price = parse_price(details['offscreen'])
+                if new_sale_price:
+                    product_data['sale_price'] = new_sale_price
+                    logger.debug("  💰 Preço promocional (fallback): R$%s", new_sale_price)
+
+        # 2. PREÇO ORIGINAL (list_price) - preço riscado "De:"
+        if details['list_price'] is not None:
+            new_list_price = parse_price(details['list_price'])
+            if new_list_price:
+                product_data['list_price'] = new_list_price
+                logger.debug("  💵 Preço original capturado: R$%s", new_list_price)
+
+        # 3. PARCELAMENTO (installment_info)
+        installment_text = (details['installment'] or '').strip()
+        if installment_text:
+            product_data['installment_info'] = installment_text
+            logger.debug("  💳 Parcelamento: %.50s...", installment_text)
+
+        # 4. FRETE (shipping_info) - atributos data-csa-c-delivery-*
+        delivery_price = details['delivery_price']
+        if delivery_price:
+            shipping_info = f"{delivery_price}"
+            if details['delivery_time']:
+                shipping_info += f" - {details['delivery_time']}"
+            product_data['shipping_info'] = shipping_info
+            logger.debug("  🚚 Frete: %s", shipping_info)
+
+        # 5. PROMOÇÕES/CUPONS (promotion_text) - múltiplas, separadas por |||
+        # dict como conjunto ordenado: a mesma promoção repetida em vários divs entra uma vez
+        promotions = {}
+        for badge_text, msg_text in details['promos']:
+            promo_text = ""
+
+            # Badge (ex: "R$300" ou "Oferta")
+            if badge_text is not None:
+                promo_text = badge_text.strip() + " "
+
+            # Mensagem da promoção (apenas o texto, não os links)
+            if msg_text is not None:
+                # Limpar texto (remover "Ver itens participantes", "Termos", etc.)
+                msg_text = _PROMO_CLEAN_RE.sub('', msg_text.strip())
+                msg_text = msg_text.strip()
+                promo_text += msg_text
+
+            if promo_text.strip():
+                promotions[promo_text.strip()] = None
+                if len(promotions) >= MAX_PROMOTIONS:
+                    break
+
+        if promotions:
+            # Juntar com ||| como separador
+            product_data['promotion_text'] = '|||'.join(promotions)
+            product_data['has_coupon'] = True
+            logger.debug("  🎟️ Promoções: %d encontradas", len(promotions))
+            if logger.isEnabledFor(logging.DEBUG):
+                for p in promotions:
+                    logger.debug("      - %.60s...", p)
+
+        # Recalcular desconto com preços atualizados
+        if product_data.get('list_price') and product_data.get('sale_price'):
+            list_p = product_data['list_price']
+            sale_p = product_data['sale_price']
+            if list_p > sale_p:
+                product_data['discount_percentage'] = int(((list_p - sale_p) / list_p) * 100)
+
+    async def process_product(self, page, product_data, pending_offers):
+        """
+        Processa um produto: gera link de afiliado e enfileira para o banco
+
+        A gravação é feita em lote pelo consumidor da fila (_offer_writer):
+        um UPSERT e um commit por URL configurada, em vez de um INSERT por produto.
 
         Args:
             page: Página Playwright
             product_data: Dados do produto
+            pending_offers: Lista de ofertas da URL aguardando gravação
 
         Returns:
-            str: Resultado ('inserted', 'updated', 'ignored', 'error')
+            str: Resultado ('queued', 'error')
         """
+        # Preço da listagem: generate_affiliate_link o substitui pelo da página
+        listing_sale_price = product_data.get('sale_price')
+
         # Gerar link de afiliado
-        affiliate_link = self.generate_affiliate_link(page, product_data)
+        affiliate_link = await self.generate_affiliate_link(page, product_data)
 
         if not affiliate_link:
-            logger.warning(f"  ⏭️ Produto ignorado (sem link de afiliado)")
+            logger.warning("  ⏭️ Produto ignorado (sem link de afiliado)")
             return 'error'
 
+        self._cache_product(product_data, affiliate_link, listing_sale_price)
+
         # Adicionar link de afiliado aos dados
         product_data['affiliate_url'] = affiliate_link
 
-        # Salvar no banco
-        result = self.db.insert_offer(product_data)
-
-        if result == 'inserted':
-            self.stats['products_saved'] += 1
-        elif result == 'updated':
-            self.stats['products_updated'] += 1
-        elif result == 'ignored':
-            self.stats['products_ignored'] += 1
-        else:
-            self.stats['errors'] += 1
+        # Enfileirar para gravação em lote
+        pending_offers.append(product_data)
 
         # Delay entre produtos
-        time.sleep(self.delays['between_products'])
+        await asyncio.sleep(self._d_between_products)
+
+        return 'queued'
+
+    def _cached_affiliate_link(self, product_data):
+        """
+        Consulta o cache pelo ASIN do produto
+
+        Os campos da página do produto em cache substituem os da listagem:
+        o preço gravado vem sempre da página do produto, com ou sem cache
+        (senão a troca de fonte mudaria o preço e reenviaria a oferta).
+        Se o preço da listagem mudou desde a gravação do cache, a entrada é
+        tratada como ausente: a página é revisitada e a mudança de preço
+        chega ao UPSERT.
+
+        Args:
+            product_data: Dados do produto (atualizado no lugar em caso de acerto)
+
+        Returns:
+            str: Link de afiliado em cache ou None se ausente/expirado
+        """
+        asin = product_data.get('asin')
+        if self.cache is None or self.force_refresh or not asin:
+            return None
+
+        cached = self.cache.get(asin)
+        if not cached or time.time() - cached['ts'] >= self.cache_ttl:
+            return None
+
+        if cached.get('listing_sale_price') != product_data.get('sale_price'):
+            logger.debug("  🔄 Preço da listagem mudou, revisitando produto: %s", asin)
+            return None
+
+        product_data.update(cached['data'])
+
+        logger.debug("  ♻️ Link em cache: %s", cached['affiliate_url'])
+        return cached['affiliate_url']
+
+    def _cache_product(self, product_data, affiliate_link, listing_sale_price):
+        """
+        Grava no cache o link de afiliado e os dados lidos da página do produto
+
+        Args:
+            product_data: Dados do produto já atualizados pela página do produto
+            affiliate_link: Link de afiliado gerado
+            listing_sale_price: Preço da listagem antes da página do produto
+                (invalida a entrada quando a listagem mostrar outro preço)
+        """
+        asin = product_data.get('asin')
+        if self.cache is None or not asin:
+            return
+
+        self.cache[asin] = {
+            'affiliate_url': affiliate_link,
+            'listing_sale_price': listing_sale_price,
+            'data': {field: product_data.get(field) for field in CACHED_PRODUCT_FIELDS},
+            'ts': time.time(),
+        }
+
+    async def _product_worker(self, page_pool, queue, product_data, pending_offers, idx, total):
+        """
+        Processa um produto numa aba emprestada do pool
+
+        Args:
+            page_pool: asyncio.Queue de abas livres do contexto da URL
+            queue: Fila de lotes consumida por _offer_writer
+            product_data: Dados do produto
+            pending_offers: Lista de ofertas da URL aguardando gravação
+            idx: Posição do produto (para log)
+            total: Total de produtos da URL (para log)
+        """
+        # Progresso em INFO só a cada log_every produtos (e no último); o resto em DEBUG
+        level = logging.INFO if idx % self.log_every == 0 or idx == total else logging.DEBUG
+        logger.log(level, "[%d/%d] Processando: %.50s...", idx, total, product_data['product_name'])
+
+        try:
+            # Modo links_only: preços da listagem + link manual, sem navegação
+            if self.links_only:
+                affiliate_link = self._manual_affiliate_link(product_data)
+                if not affiliate_link:
+                    logger.warning("  ⏭️ Produto ignorado (sem ASIN ou AMAZON_ASSOCIATE_TAG)")
+                    return
+                product_data['affiliate_url'] = affiliate_link
+                pending_offers.append(product_data)
+                return
+
+            # ASIN visitado recentemente: sem navegação nem delay, não ocupa aba
+            affiliate_link = self._cached_affiliate_link(product_data)
+            if affiliate_link:
+                product_data['affiliate_url'] = affiliate_link
+                pending_offers.append(product_data)
+                return
+
+            page = await page_pool.get()
+            try:
+                await self.process_product(page, product_data, pending_offers)
+            finally:
+                # Descarregar a página do produto antes de devolver a aba
+                try:
+                    await page.goto('about:blank')
+                except PlaywrightError as e:
+                    logger.debug("Erro ao limpar aba: %s", e)
+                page_pool.put_nowait(page)
+        finally:
+            # Lote parcial a cada flush_every ofertas: URLs longas não
+            # esperam o fim para gravar nem perdem tudo se o processo cair
+            if len(pending_offers) >= self.flush_every:
+                queue.put_nowait(pending_offers[:])
+                pending_offers.clear()
+
+    async def _offer_writer(self, queue):
+        """
+        Consumidor único da fila de lotes: grava no banco em série
+
+        Cada lote vai para insert_offers_bulk em uma thread (psycopg2 é
+        bloqueante), sem travar o event loop das páginas. None encerra.
+        """
+        while True:
+            offers = await queue.get()
+            if offers is None:
+                break
+
+            counts = await asyncio.to_thread(self.db.insert_offers_bulk, offers)
+
+            self.stats['products_saved'] += counts['inserted']
+            self.stats['products_updated'] += counts['updated']
+            self.stats['products_ignored'] += counts['ignored']
+            self.stats['errors'] += counts['error']
+
+    async def _scrape_config(self, browser, semaphore, queue, url_config):
+        """
+        Processa uma URL configurada em um contexto próprio do navegador
+
+        Args:
+            browser: Navegador compartilhado entre as URLs
+            semaphore: Limita quantas URLs rodam ao mesmo tempo
+            queue: Fila de lotes consumida por _offer_writer
+            url_config: Configuração da URL (do config.yml)
+        """
+        async with semaphore:
+            # Sessão salva vai direto para o contexto (cookies + localStorage)
+            storage_state = self._storage_state()
+            if not storage_state:
+                logger.error("❌ Nenhuma sessão encontrada. Execute capture_session.py primeiro!")
+                return
+
+            context = await browser.new_context(
+                viewport={'width': 1920, 'height': 1080},
+                user_agent=USER_AGENT,
+                locale='pt-BR',
+                timezone_id='America/Sao_Paulo',
+                storage_state=storage_state
+            )
+            pending_offers = []
+
+            try:
+                # Bloquear no contexto vale para todas as páginas abertas nele
+                if self.blocked_resource_types or self.blocked_url_patterns:
+                    await context.route('**/*', self._route_request)
+
+                page = await context.new_page()
+                self.stats['urls_processed'] += 1
+
+                # Scraping da listagem
+                products = await self.scrape_listing_page(page, url_config)
+                self.stats['products_found'] += len(products)
+
+                if not products:
+                    return
+
+                # Processar cada produto
+                logger.info("")
+                logger.info(f"🔄 Processando {len(products)} produtos de {url_config['name']}...")
+                logger.info("")
+
+                # Pool de abas reaproveitadas: limita a concorrência a
+                # product_concurrency sem abrir/fechar uma aba por produto
+                page_pool = asyncio.Queue()
+                pool_size = 0 if self.links_only else min(self.product_concurrency, len(products))
+                for _ in range(pool_size):
+                    product_page = await context.new_page()
+                    # Rota da página tem prioridade sobre a do contexto
+                    if self.product_blocked_resource_types or self.product_blocked_url_patterns:
+                        await product_page.route('**/*', self._route_product_request)
+                    page_pool.put_nowait(product_page)
+
+                workers = [
+                    asyncio.create_task(
+                        self._product_worker(page_pool, queue, product_data, pending_offers, idx, len(products))
+                    )
+                    for idx, product_data in enumerate(products, 1)
+                ]
+                try:
+                    await asyncio.gather(*workers)
+                except BaseException:
+                    # gather propaga a primeira falha sem parar os demais: cancelar
+                    # e esperar todos antes de fechar o contexto e gravar o lote final
+                    for worker in workers:
+                        worker.cancel()
+                    await asyncio.gather(*workers, return_exceptions=True)
+                    raise
+
+                logger.info("")
+                logger.info(f"✅ URL concluída: {url_config['name']}")
+                logger.info("")
 
-        return result
+            except Exception as e:
+                logger.error(f"❌ Erro ao processar {url_config['name']}: {e}")
+
+            finally:
+                # Não perder ofertas já processadas se a URL falhou no meio
+                if pending_offers:
+                    await queue.put(pending_offers)
+                await context.close()
 
-    def run(self):
+    async def run(self):
         """Executa o scraper completo"""
         logger.info("=" * 70)
         logger.info("AMAZON AFFILIATE SCRAPER")
@@ -1086,6 +1536,11 @@ class AmazonScraper:
             logger.error("❌ Falha na conexão com banco de dados!")
             return
 
+        # Garantir coluna url_base e índice único usados na deduplicação
+        if not self.db.ensure_schema():
+            logger.error("❌ Falha ao preparar schema de amazon_offers!")
+            return
+
         # Pegar URLs habilitadas
         enabled_configs = [c for c in self.config['scraping_configs'] if c.get('enabled', True)]
 
@@ -1093,62 +1548,39 @@ class AmazonScraper:
             logger.warning("⚠️ Nenhuma URL habilitada no config.yml")
             return
 
-        logger.info(f"📋 {len(enabled_configs)} URL(s) para processar")
+        logger.info(f"📋 {len(enabled_configs)} URL(s) para processar ({self.parallel_urls} em paralelo)")
         logger.info("")
 
-        # Iniciar navegador (headless por padrão para não atrapalhar o usuário)
-        with sync_playwright() as p:
-            browser = p.chromium.launch(
-                headless=os.getenv('HEADLESS', 'True').lower() == 'true',
-                args=[
-                    '--disable-blink-features=AutomationControlled',
-                    '--no-sandbox',
-                    '--disable-dev-shm-usage',
-                    '--disable-gpu'
-                ]
-            )
-
-            context = browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                locale='pt-BR',
-                timezone_id='America/Sao_Paulo'
-            )
+        # Iniciar (ou reaproveitar) o navegador
+        async with async_playwright() as p:
+            browser = await self._launch_browser(p)
 
-            # Carregar sessão
-            if not self._load_session(context):
-                browser.close()
-                return
-
-            page = context.new_page()
+            # Um contexto por URL no mesmo navegador; gravações serializadas
+            # por um único consumidor da fila
+            semaphore = asyncio.Semaphore(self.parallel_urls)
+            queue = asyncio.Queue()
+            writer = asyncio.create_task(self._offer_writer(queue))
+            if self.bestseller_http:
+                self.http_client = self._create_http_client()
+            if self.cache_enabled:
+                self.cache = shelve.open(self.cache_path)
 
             try:
-                # Processar cada URL configurada
-                for url_config in enabled_configs:
-                    self.stats['urls_processed'] += 1
-
-                    # Scraping da listagem
-                    products = self.scrape_listing_page(page, url_config)
-                    self.stats['products_found'] += len(products)
-
-                    if not products:
-                        continue
-
-                    # Processar cada produto
-                    logger.info("")
-                    logger.info(f"🔄 Processando {len(products)} produtos...")
-                    logger.info("")
-
-                    for idx, product_data in enumerate(products, 1):
-                        logger.info(f"[{idx}/{len(products)}] Processando: {product_data['product_name'][:50]}...")
-                        self.process_product(page, product_data)
-
-                    logger.info("")
-                    logger.info(f"✅ URL concluída: {url_config['name']}")
-                    logger.info("")
-
+                await asyncio.gather(*(
+                    self._scrape_config(browser, semaphore, queue, url_config)
+                    for url_config in enabled_configs
+                ))
             finally:
-                browser.close()
+                await queue.put(None)
+                await writer
+                if self.http_client is not None:
+                    await self.http_client.aclose()
+                    self.http_client = None
+                if self.cache is not None:
+                    self.cache.close()
+                    self.cache = None
+                # Navegador via CDP: só desconecta, o browser_server.py continua aberto
+                await browser.close()
 
         # Relatório final
         self._print_report()
@@ -1171,8 +1603,15 @@ class AmazonScraper:
 
 def main():
     """Função principal"""
-    scraper = AmazonScraper()
-    scraper.run()
+    parser = argparse.ArgumentParser(description='Amazon Affiliate Scraper')
+    parser.add_argument('--force-refresh', action='store_true',
+                        help='ignora o cache de links e revisita todas as páginas de produto')
+    parser.add_argument('--links-only', action='store_true',
+                        help='grava só os dados da listagem com link manual (não abre páginas de produto)')
+    args = parser.parse_args()
+
+    scraper = AmazonScraper(force_refresh=args.force_refresh, links_only=args.links_only)
+    asyncio.run(scraper.run())
 
 
 if __name__ == '__main__':